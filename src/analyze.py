@@ -1,7 +1,9 @@
 import os
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+
+
+# matplotlib and seaborn are imported inside the plotting functions so that
+# importing this module (and main.py) stays cheap for non-plotting commands.
 
 
 # --- 1. CONDUCT EDA
@@ -19,6 +21,8 @@ def analyze_aw_fb_data(aw_fb_df, save_dir=None):
             3. Sex
     """
     try:
+        import matplotlib.pyplot as plt
+
         grouped = (
             aw_fb_df.groupby(['Age_Bin', 'Device', 'Sex'])
             .size()
@@ -84,6 +88,8 @@ def analyze_chronic_data(chronic_age_df, chronic_race_df, chronic_sex_df, save_d
         Three bar plots showing the distribution of each dataframe.
     """
     try:
+        import matplotlib.pyplot as plt
+
         # Chronic age counts
         age_counts = chronic_age_df['age_bin'].value_counts().sort_index()
         plt.figure(figsize=(10, 6))
@@ -148,6 +154,8 @@ def analyze_nutri_data(nutri_sex_df, nutri_age_df, nutri_race_df, save_dir=None)
         Three bar plots showing the distribution of each dataframe.
     """
     try:
+        import matplotlib.pyplot as plt
+
         # Nutri sex counts
         sex_counts = nutri_sex_df['Sex'].value_counts()
         plt.figure(figsize=(7, 5))
@@ -214,16 +222,19 @@ def analyze_assigned_diseases(full_df) -> tuple:
             - disease_age: DataFrame of disease by Age_Bin.
     """
     try:
-        full_df['Assigned_Disease'] = full_df['Assigned_Disease'].replace({'Nutrition, Physical Activity, and Weight Status': 'NPW'})
+        # The long topic name is shortened in the (small) results, not in full_df
+        short_names = {'Nutrition, Physical Activity, and Weight Status': 'NPW'}
 
         print("Counting number of each disease...")
-        disease_counts = full_df['Assigned_Disease'].value_counts(dropna=True)
+        disease_counts = full_df['Assigned_Disease'].value_counts(dropna=True).rename(index=short_names)
 
         print("Analyzing disease by sex...")
         disease_sex = full_df.pivot_table(index='Assigned_Disease', columns='Sex', aggfunc='size', fill_value=0)
-        
+        disease_sex = disease_sex.rename(index=short_names).sort_index()
+
         print("Analyzing disease by age")
         disease_age = full_df.pivot_table(index='Assigned_Disease', columns='Age_Bin', aggfunc='size', fill_value=0)
+        disease_age = disease_age.rename(index=short_names).sort_index()
 
         return disease_counts, disease_sex, disease_age
     
@@ -231,7 +242,7 @@ def analyze_assigned_diseases(full_df) -> tuple:
         print(f"Unable to analyze disease assignments: {e}")
 
 
-def plot_disease_results(disease_counts, disease_sex, disease_age, save_dir=None):
+def plot_disease_results(disease_counts, disease_sex, disease_age, save_dir=None, suffix=''):
     """
     Plots bar charts for disease assignment analyses.
 
@@ -239,12 +250,16 @@ def plot_disease_results(disease_counts, disease_sex, disease_age, save_dir=None
         disease_counts: Series with disease assignment counts.
         disease_sex: DataFrame of disease by Sex.
         disease_age: DataFrame of disease by Age_Bin.
+        save_dir: If given, the plots are saved here.
+        suffix: Added to the saved file names (e.g. '_sketch' for approximate counts).
 
     Returns:
         Three bar plots visually portraying the relationships in each of the three inputs.
     """
     
     try:
+        import matplotlib.pyplot as plt
+
         # Disease counts
         plt.figure(figsize=(10, 8))
         disease_counts.plot(kind='bar')
@@ -256,7 +271,7 @@ def plot_disease_results(disease_counts, disease_sex, disease_age, save_dir=None
         plt.show()
 
         if save_dir is not None:
-            plt.savefig(os.path.join(save_dir, "disease_counts.png"))
+            plt.savefig(os.path.join(save_dir, f"disease_counts{suffix}.png"))
             plt.close()
         
         # Disease by Sex
@@ -271,7 +286,7 @@ def plot_disease_results(disease_counts, disease_sex, disease_age, save_dir=None
         plt.show()
 
         if save_dir is not None:
-            plt.savefig(os.path.join(save_dir, "disease_by_sex.png"))
+            plt.savefig(os.path.join(save_dir, f"disease_by_sex{suffix}.png"))
             plt.close()
 
         # Disease by Age Bin
@@ -286,7 +301,7 @@ def plot_disease_results(disease_counts, disease_sex, disease_age, save_dir=None
         plt.show()
 
         if save_dir is not None:
-            plt.savefig(os.path.join(save_dir, "disease_by_age.png"))
+            plt.savefig(os.path.join(save_dir, f"disease_by_age{suffix}.png"))
             plt.close()
     
     except Exception as e:
@@ -305,6 +320,9 @@ def analyze_dem_info(full_df, save_dir=None):
     """
     
     try: 
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
         plt.figure(figsize=(8,6))
         sns.boxplot(x='Sex', y='BMI', hue='Age_Bin', data=full_df)
         plt.title('BMI Distribution by Sex and Age Bin', fontsize=18)
@@ -316,3 +334,49 @@ def analyze_dem_info(full_df, save_dir=None):
     
     except Exception as e:
         print(f"Unable to create visualizations: {e}")
+
+
+# --- 4. PLOT APPROXIMATE RESULTS FROM SKETCHES
+def plot_sketch_results(result_sketch, save_dir=None):
+    """
+    Plots the disease bar charts of plot_disease_results and BMI / heart rate box plots by Sex and
+    Age Bin from a ResultSketch (sketch.py) instead of the full result table. Every file name ends in
+    '_sketch', so the exact plots of a full run are not overwritten.
+    Boxes show the sketched quartiles and whiskers the 5th and 95th percentiles.
+
+    Args:
+        result_sketch: A ResultSketch, e.g. from sketch.load_sketches.
+        save_dir: If given, the plots are saved here.
+    """
+
+    try:
+        import matplotlib.pyplot as plt
+
+        disease_counts, disease_sex, disease_age = result_sketch.disease_tables()
+        plot_disease_results(disease_counts, disease_sex, disease_age, save_dir=save_dir, suffix='_sketch')
+
+        sexes = sorted(result_sketch.labels['Sex'])
+        age_bins = sorted(result_sketch.labels['Age_Bin'])
+        for col in ('BMI', 'heart_rate'):
+            stats = []
+            for sex in sexes:
+                for age_bin in age_bins:
+                    distribution = result_sketch.distribution(col, sex=sex, age_bin=age_bin)
+                    if distribution.count == 0:
+                        continue
+                    whislo, q1, med, q3, whishi = distribution.quantiles([0.05, 0.25, 0.5, 0.75, 0.95])
+                    stats.append({'label': f"{sex}\n{age_bin}", 'whislo': whislo, 'q1': q1, 'med': med, 'q3': q3, 'whishi': whishi})
+
+            fig, ax = plt.subplots(figsize=(10, 6))
+            ax.bxp(stats, showfliers=False)
+            ax.set_title(f"{col} Distribution by Sex and Age Bin (sketched)", fontsize=18)
+            ax.set_ylabel(col)
+            plt.tight_layout()
+            plt.show()
+
+            if save_dir is not None:
+                plt.savefig(os.path.join(save_dir, f"{col.lower()}_sketch.png"))
+                plt.close()
+
+    except Exception as e:
+        print(f"Unable to create visualizations: {e}")
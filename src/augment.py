@@ -1,6 +1,71 @@
+import json
+import pickle
+import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
+
+
+# scikit-learn is imported inside each function so that importing this module
+# does not pay for it unless a model is actually trained.
+
+
+# RandomForestClassifier parameters of each classifier in this module
+FOREST_DEFAULTS = {
+    'nutri_sex': {'random_state': 42, 'class_weight': 'balanced'},
+    'nutri_age': {'random_state': 42, 'class_weight': 'balanced'},
+    'chronic_sex': {'random_state': 42},
+    'chronic_age': {'random_state': 42, 'class_weight': 'balanced'},
+    'obesity': {'random_state': 42, 'class_weight': 'balanced'},
+    'disease': {'random_state': 42, 'class_weight': 'balanced'},
+}
+
+# Per-classifier overrides of FOREST_DEFAULTS (e.g. n_estimators, max_depth, min_samples_leaf).
+# Filled by load_forest_params from the output of tune.py; empty means scikit-learn defaults.
+FOREST_PARAMS = {}
+
+
+def forest_params(name) -> dict:
+    """
+    Returns the RandomForestClassifier parameters for a classifier: FOREST_DEFAULTS[name] updated by FOREST_PARAMS[name].
+    """
+    return {**FOREST_DEFAULTS[name], **FOREST_PARAMS.get(name, {})}
+
+
+def load_forest_params(path) -> dict:
+    """
+    Loads tuned per-classifier parameters (written by tune.py) into FOREST_PARAMS.
+
+    Args:
+        path: A JSON file mapping classifier name to RandomForestClassifier parameters.
+
+    Returns:
+        dict: FOREST_PARAMS after loading.
+    """
+    with open(path) as f:
+        FOREST_PARAMS.update(json.load(f))
+    return FOREST_PARAMS
+
+
+def fit_forest(name, X, y, strata_df=None, max_rows=None, time_budget=None):
+    """
+    Fits the named RandomForestClassifier, on a stratified sample when a row or time budget is given (see sample.py).
+
+    Args:
+        name: The classifier name in FOREST_DEFAULTS.
+        X, y: The encoded training data.
+        strata_df: The columns whose proportions the sample preserves (needed with a budget).
+        max_rows: Fit on at most this many rows.
+        time_budget: Fit within roughly this many seconds.
+
+    Returns:
+        The fitted RandomForestClassifier.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sample import fit_within_budget
+
+    make_clf = lambda: RandomForestClassifier(**forest_params(name))
+    if max_rows is None and time_budget is None:
+        return make_clf().fit(X, y)
+    return fit_within_budget(make_clf, X, y, strata_df, max_rows=max_rows, time_budget=time_budget)[0]
 
 
 def predict_sex_age_nutri(nutri_sex_df, nutri_age_df, nutri_race_df) -> pd.DataFrame:
@@ -13,9 +78,16 @@ def predict_sex_age_nutri(nutri_sex_df, nutri_age_df, nutri_race_df) -> pd.DataF
         nutri_age_df: A DataFrame from nutri_df stratified by age.
 
     Returns:
-        pd.DataFrame: nutri_race_df with assigned Sex and Age Bin columns.
+        pd.DataFrame: A new DataFrame of nutri_race_df with assigned Sex and Age Bin columns (nutri_race_df is not modified).
     """
     try:
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.preprocessing import LabelEncoder
+
+        if nutri_race_df.empty:
+            # Nothing to impute (e.g. a partition without Race/Ethnicity rows)
+            return nutri_race_df.assign(Sex=pd.Series(dtype=object), Age_Bin=pd.Series(dtype=object))
+
         print("Using RandomForestClassifier and one-hot-encoding for nutri_df...")
 
         feature_cols = ['YearStart', 'YearEnd', 'LocationDesc', 'Topic']  
@@ -28,15 +100,14 @@ def predict_sex_age_nutri(nutri_sex_df, nutri_age_df, nutri_race_df) -> pd.DataF
         y_sex_le = le_sex.fit_transform(y_sex)
 
         print("Running classifier for Sex...")
-        rfc_sex_clf = RandomForestClassifier(random_state=42, class_weight='balanced')
+        rfc_sex_clf = RandomForestClassifier(**forest_params('nutri_sex'))
         rfc_sex_clf.fit(X_sex, y_sex_le)
 
         X_race = pd.get_dummies(nutri_race_df[feature_cols])
         X_race_sex = X_race.reindex(columns=X_sex.columns, fill_value=0)
 
         print("Assigning Sex...")
-        sex_preds = rfc_sex_clf.predict(X_race_sex)
-        nutri_race_df['Sex'] = le_sex.inverse_transform(sex_preds)
+        sex_preds = le_sex.inverse_transform(rfc_sex_clf.predict(X_race_sex))
 
         # Assign Age Bin
         X_age = pd.get_dummies(nutri_age_df[feature_cols])
@@ -46,35 +117,43 @@ def predict_sex_age_nutri(nutri_sex_df, nutri_age_df, nutri_race_df) -> pd.DataF
         y_age_le = le_age.fit_transform(y_age)
 
         print("Training classifier for Age Bin...")
-        rfc_age_clf = RandomForestClassifier(random_state=42, class_weight='balanced')
+        rfc_age_clf = RandomForestClassifier(**forest_params('nutri_age'))
         rfc_age_clf.fit(X_age, y_age_le)
 
         X_race_age = X_race.reindex(columns=X_age.columns, fill_value=0)
 
         print("Assigning Age Bin...")
-        age_preds = rfc_age_clf.predict(X_race_age)
-        nutri_race_df['Age_Bin'] = le_age.inverse_transform(age_preds)
+        age_preds = le_age.inverse_transform(rfc_age_clf.predict(X_race_age))
 
         print("Sex and Age Bin successfully assigned to nutri_df!")
-        return nutri_race_df
+        return nutri_race_df.assign(Sex=sex_preds, Age_Bin=age_preds)
 
     except Exception as e:
         print(f"Sex and Age Bin could not be assigned to nutri_df: {e}")
 
 
-def predict_sex_age_chronic(chronic_sex_df, chronic_age_df, chronic_race_df) -> pd.DataFrame:
+def predict_sex_age_chronic(chronic_sex_df, chronic_age_df, chronic_race_df, max_rows=None, time_budget=None) -> pd.DataFrame:
     """
     Use RandomForestClassifier and one-hot-encoding to assign Age Bin to chronic_race_df.
 
     Args:
         chronic_age_df: A DataFrame from chronic_df stratified by age.
         chronice_race_df: A DataFrame from chronic_df stratified by rage.
+        max_rows: If given, each classifier is fitted on a sample of at most this many rows that
+                  preserves the label and LocationDesc proportions.
+        time_budget: If given, each classifier is fitted on a sample sized to take about this many seconds.
 
     Returns:
-        pd.DataFrame: chronic_race_df with assigned Sex and Age Bin column.
+        pd.DataFrame: A new DataFrame of chronic_race_df with assigned Sex and Age Bin columns (chronic_race_df is not modified).
     """
 
     try:
+        from sklearn.preprocessing import LabelEncoder
+
+        if chronic_race_df.empty:
+            # Nothing to impute (e.g. a partition without Race/Ethnicity rows)
+            return chronic_race_df.assign(Sex=pd.Series(dtype=object), Age_Bin=pd.Series(dtype=object))
+
         print("Using RandomForestClassifier and one-hot-encoding for chronic_df...")
 
         feature_cols = ['YearStart', 'YearEnd', 'LocationDesc', 'Topic']  
@@ -87,15 +166,14 @@ def predict_sex_age_chronic(chronic_sex_df, chronic_age_df, chronic_race_df) ->
         y_sex_le = le_sex.fit_transform(y_sex)
 
         print("Running classifier for Sex...")
-        rfc_sex_clf = RandomForestClassifier(random_state=42)
-        rfc_sex_clf.fit(X_sex, y_sex_le)
+        rfc_sex_clf = fit_forest('chronic_sex', X_sex, y_sex_le, chronic_sex_df[['Sex', 'LocationDesc']],
+                                 max_rows=max_rows, time_budget=time_budget)
 
         X_race = pd.get_dummies(chronic_race_df[feature_cols])
         X_race_sex = X_race.reindex(columns=X_sex.columns, fill_value=0)
 
         print("Assigning Sex...")
-        sex_preds = rfc_sex_clf.predict(X_race_sex)
-        chronic_race_df['Sex'] = le_sex.inverse_transform(sex_preds)
+        sex_preds = le_sex.inverse_transform(rfc_sex_clf.predict(X_race_sex))
 
         # Assign Age Bin
         X_age = pd.get_dummies(chronic_age_df[feature_cols])
@@ -105,59 +183,269 @@ def predict_sex_age_chronic(chronic_sex_df, chronic_age_df, chronic_race_df) ->
         y_age_le = le_age.fit_transform(y_age)
 
         print("Training classifier for Age Bin...")
-        rfc_age_clf = RandomForestClassifier(random_state=42, class_weight='balanced')
-        rfc_age_clf.fit(X_age, y_age_le)
+        rfc_age_clf = fit_forest('chronic_age', X_age, y_age_le, chronic_age_df[['age_bin', 'LocationDesc']],
+                                 max_rows=max_rows, time_budget=time_budget)
 
         X_race_age = X_race.reindex(columns=X_age.columns, fill_value=0)
 
         print("Assigning Age Bin...")
-        age_preds = rfc_age_clf.predict(X_race_age)
-        chronic_race_df['Age_Bin'] = le_age.inverse_transform(age_preds)
+        age_preds = le_age.inverse_transform(rfc_age_clf.predict(X_race_age))
 
         print("Sex and Age Bin successfully assigned to chronic_df!")
-        return chronic_race_df
+        return chronic_race_df.assign(Sex=sex_preds, Age_Bin=age_preds)
 
     except Exception as e:
         print(f"Age Bin could not be assigned to chronic_df: {e}")
 
 
-def predict_obesity(nutri_combined, chronic_combined) -> pd.DataFrame:
+def predict_sex_age_parallel(nutri_sex_df, nutri_age_df, nutri_race_df, chronic_sex_df, chronic_age_df, chronic_race_df, max_workers=None,
+                             max_rows=None, time_budget=None) -> tuple:
+    """
+    Runs the four fits of predict_sex_age_nutri and predict_sex_age_chronic in parallel worker processes.
+    The one-hot-encoded matrices are written once as memory-mapped .npy files (see shared.py) and the
+    workers attach to them instead of receiving pickled copies. Predictions match the serial functions.
+
+    Args:
+        nutri_sex_df, nutri_age_df, nutri_race_df: The DataFrames from process_nutri_data.
+        chronic_sex_df, chronic_age_df, chronic_race_df: The DataFrames from process_chronic_data.
+        max_workers: Worker processes (default: up to one per fit).
+        max_rows, time_budget: As for predict_sex_age_chronic; the chronic training rows are sampled
+                               here and only the sample is shared with the workers.
+
+    Returns:
+        tuple: (nutri_combined, chronic_combined), new DataFrames of the race DataFrames with assigned Sex and Age_Bin columns.
+    """
+    try:
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.preprocessing import LabelEncoder
+        from shared import FeatureMatrixStore, run_parallel_fits
+        from sample import budget_rows
+
+        print("Using RandomForestClassifier and one-hot-encoding for nutri_df and chronic_df in parallel...")
+
+        feature_cols = ['YearStart', 'YearEnd', 'LocationDesc', 'Topic']
+        fits = {
+            # name: (training DataFrame, label column, DataFrame to assign, RandomForestClassifier params)
+            'nutri_sex': (nutri_sex_df, 'Sex', nutri_race_df, forest_params('nutri_sex')),
+            'nutri_age': (nutri_age_df, 'age_bin', nutri_race_df, forest_params('nutri_age')),
+            'chronic_sex': (chronic_sex_df, 'Sex', chronic_race_df, forest_params('chronic_sex')),
+            'chronic_age': (chronic_age_df, 'age_bin', chronic_race_df, forest_params('chronic_age')),
+        }
+        # Fits with a row or time budget, as in predict_sex_age_chronic
+        budgeted = {'chronic_sex': ['Sex', 'LocationDesc'], 'chronic_age': ['age_bin', 'LocationDesc']}
+
+        with FeatureMatrixStore() as store:
+            tasks, encoders = [], {}
+            for name, (train_df, label_col, apply_df, params) in fits.items():
+                X_train = pd.get_dummies(train_df[feature_cols])
+                X_apply = pd.get_dummies(apply_df[feature_cols]).reindex(columns=X_train.columns, fill_value=0)
+
+                encoders[name] = LabelEncoder()
+                y_train = encoders[name].fit_transform(train_df[label_col])
+
+                if name in budgeted and (max_rows is not None or time_budget is not None):
+                    rows = budget_rows(lambda: RandomForestClassifier(**params), X_train, y_train, train_df[budgeted[name]],
+                                       max_rows=max_rows, time_budget=time_budget)
+                    print(f"{name}: fitting on a stratified sample of {len(rows)} of {len(X_train)} rows...")
+                    X_train, y_train = X_train.iloc[rows], y_train[rows]
+
+                tasks.append({
+                    'name': name,
+                    'X_train': store.put(f"{name}_X_train", X_train),
+                    'y_train': store.put(f"{name}_y_train", y_train, dtype=np.int64),
+                    'X_apply': store.put(f"{name}_X_apply", X_apply),
+                    'params': params,
+                })
+
+            print(f"Running {len(tasks)} classifiers...")
+            results = run_parallel_fits(tasks, max_workers=max_workers)
+
+        assigned = {name: encoders[name].inverse_transform(results[name]['predictions']) for name in fits}
+
+        print("Sex and Age Bin successfully assigned to nutri_df and chronic_df!")
+        return (nutri_race_df.assign(Sex=assigned['nutri_sex'], Age_Bin=assigned['nutri_age']),
+                chronic_race_df.assign(Sex=assigned['chronic_sex'], Age_Bin=assigned['chronic_age']))
+
+    except Exception as e:
+        print(f"Sex and Age Bin could not be assigned in parallel: {e}")
+
+
+def predict_obesity(nutri_combined, chronic_combined, max_rows=None, time_budget=None) -> pd.DataFrame:
     """"
     Use RandomForestClassifier and one-hot-encoding to predict a secondary disease for chronic_combined based on nutri_combined.
     Args:
         nutri_combined: An engineered DataFrame with added Sex and Age_Bin columns.
         chronic_combined: An engineered DataFrame with added Sex and Age_Bin columns.
+        max_rows: If given, the classifier is fitted on a sample of at most this many rows that
+                  preserves the Obesity_Binary and LocationDesc proportions.
+        time_budget: If given, the classifier is fitted on a sample sized to take about this many seconds.
 
     Returns:
-        pd.DataFrame: A cleaned DataFrame that has Obesity / Weight Status predicted as a secondary disease.
+        pd.DataFrame: A new DataFrame of chronic_combined with Obesity / Weight Status predicted as a secondary disease (Obesity_Binary).
     """
 
     try:
         feature_cols = ['LocationDesc', 'Race/Ethnicity', 'Sex', 'Age_Bin']
         
         print(f"Assigning binary values for presence of obesity / weight problems...")
-        nutri_combined['Obesity_Binary'] = (nutri_combined['Topic'] == 'Obesity / Weight Status').astype(int)
-        
+        y_nutri = (nutri_combined['Topic'] == 'Obesity / Weight Status').astype(int).rename('Obesity_Binary')
+
         X_nutri = pd.get_dummies(nutri_combined[feature_cols])
-        y_nutri = nutri_combined['Obesity_Binary']
 
         print("Training classifier for Obesity_Binary...")
-        rfc_obesity_clf = RandomForestClassifier(random_state=42, class_weight='balanced')
-        rfc_obesity_clf.fit(X_nutri, y_nutri)
+        strata_df = None
+        if max_rows is not None or time_budget is not None:
+            strata_df = pd.concat([y_nutri, nutri_combined['LocationDesc']], axis=1)
+        rfc_obesity_clf = fit_forest('obesity', X_nutri, y_nutri, strata_df, max_rows=max_rows, time_budget=time_budget)
 
         print("Assigning Obesity_Binary...")
         X_chronic = pd.get_dummies(chronic_combined[feature_cols])
         X_chronic = X_chronic.reindex(columns=X_nutri.columns, fill_value=0)
-        chronic_combined['Obesity_Binary'] = rfc_obesity_clf.predict(X_chronic)
+        obesity_preds = rfc_obesity_clf.predict(X_chronic)
 
         print("Obesity_Binary successfully assigned!")
-        return chronic_combined
+        return chronic_combined.assign(Obesity_Binary=obesity_preds)
     
     except Exception as e:
         print(f"Obesity / Weight Status could not be predicted: {e}")
 
 
-def assign_disease(second_disease_df, aw_fb_df) -> pd.DataFrame:
+def budget_reports(chronic_sex_df, chronic_age_df, chronic_race_df, nutri_combined, chronic_combined, max_rows=None, time_budget=None) -> pd.DataFrame:
+    """
+    Reports what a row or time budget costs predict_sex_age_chronic and predict_obesity: for each
+    classifier, held-out accuracy and fit time of a budgeted versus a full fit, and how often their
+    predictions agree on the rows they assign (see sample.budget_report).
+
+    Args:
+        chronic_sex_df, chronic_age_df, chronic_race_df: The DataFrames from process_chronic_data.
+        nutri_combined: The DataFrame from predict_sex_age_nutri.
+        chronic_combined: The DataFrame from predict_sex_age_chronic.
+        max_rows, time_budget: The budget to evaluate.
+
+    Returns:
+        pd.DataFrame: One row per classifier.
+    """
+    try:
+        from sklearn.ensemble import RandomForestClassifier
+        from sample import budget_report
+
+        survey_cols = ['YearStart', 'YearEnd', 'LocationDesc', 'Topic']
+        demographic_cols = ['LocationDesc', 'Race/Ethnicity', 'Sex', 'Age_Bin']
+        obesity_binary = (nutri_combined['Topic'] == 'Obesity / Weight Status').astype(int).rename('Obesity_Binary')
+
+        fits = {
+            # name: (training features, labels, strata, rows the classifier is applied to)
+            'chronic_sex': (chronic_sex_df[survey_cols], chronic_sex_df['Sex'], chronic_sex_df[['Sex', 'LocationDesc']], chronic_race_df[survey_cols]),
+            'chronic_age': (chronic_age_df[survey_cols], chronic_age_df['age_bin'], chronic_age_df[['age_bin', 'LocationDesc']], chronic_race_df[survey_cols]),
+            'obesity': (nutri_combined[demographic_cols], obesity_binary, pd.concat([obesity_binary, nutri_combined['LocationDesc']], axis=1), chronic_combined[demographic_cols]),
+        }
+
+        reports = []
+        for name, (features, labels, strata, apply_features) in fits.items():
+            print(f"Comparing budgeted and full fits for {name}...")
+            X = pd.get_dummies(features)
+            X_apply = pd.get_dummies(apply_features).reindex(columns=X.columns, fill_value=0)
+            make_clf = lambda name=name: RandomForestClassifier(**forest_params(name))
+            report = budget_report(make_clf, X, labels.to_numpy(), strata, X_apply, max_rows=max_rows, time_budget=time_budget)
+            reports.append({'classifier': name, **report})
+
+        return pd.DataFrame(reports)
+
+    except Exception as e:
+        print(f"Budget could not be evaluated: {e}")
+
+
+def fit_disease_model(second_disease_df) -> dict:
+    """
+    Use RandomForestClassifier and one-hot-encoding to learn which disease goes with each Sex and Age_Bin.
+
+    Args:
+        second_disease_df: A full DataFrame indicating whether a person may also be experience obesity / weight problems.
+
+    Returns:
+        dict: The fitted model with keys:
+            - clf: The fitted RandomForestClassifier.
+            - encoder: The LabelEncoder for Topic.
+            - feature_cols: The input columns used for one-hot-encoding.
+            - columns: The one-hot-encoded training columns.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import LabelEncoder
+
+    feature_cols = ['Sex', 'Age_Bin']
+    train_df = second_disease_df[second_disease_df['Obesity_Binary'] == 1]
+
+    X_train = pd.get_dummies(train_df[feature_cols])
+    y_train = train_df['Topic'] 
+
+    le_topic = LabelEncoder()
+    y_train_le = le_topic.fit_transform(y_train)
+
+    print("Training classifier for predicting disease...")
+    rfc_disease_clf = RandomForestClassifier(**forest_params('disease'))
+    rfc_disease_clf.fit(X_train, y_train_le)
+
+    return {'clf': rfc_disease_clf, 'encoder': le_topic, 'feature_cols': feature_cols, 'columns': X_train.columns}
+
+
+def apply_disease_model(model, aw_fb_df, min_exceedances=None, verbose=True) -> pd.DataFrame:
+    """
+    Assign diseases to a cleaned aw_fb DataFrame using a model from fit_disease_model.
+
+    Args:
+        model: The dict returned by fit_disease_model or load_disease_model.
+        aw_fb_df: A cleaned DataFrame of Apple Watch and FitBit data.
+        min_exceedances: If given, a disease is only assigned when at least this many readings in the
+                         rolling window were flagged (exceed_roll_count from add_rolling_heart_features),
+                         instead of the single reading's Disease flag.
+        verbose: If False, progress messages are not printed.
+
+    Returns:
+        pd.DataFrame: A new DataFrame of aw_fb_df with Possible_Disease and Assigned_Disease columns (aw_fb_df is not modified).
+    """
+    X_awfb = pd.get_dummies(aw_fb_df[model['feature_cols']])
+    X_awfb = X_awfb.reindex(columns=model['columns'], fill_value=0)
+    possible_disease = model['encoder'].inverse_transform(model['clf'].predict(X_awfb))
+
+    if verbose:
+        print("Assigning whether disease should exist or not...")
+    if min_exceedances is None:
+        flagged = aw_fb_df['Disease'].to_numpy() == 1
+    else:
+        flagged = aw_fb_df['exceed_roll_count'].to_numpy() >= min_exceedances
+    flagged &= aw_fb_df['Possible Obesity'].to_numpy() == 1
+    assigned_disease = np.where(flagged, possible_disease.astype(object), None)
+
+    return aw_fb_df.assign(Possible_Disease=possible_disease, Assigned_Disease=assigned_disease)
+
+
+def save_disease_model(model, path):
+    """
+    Pickles a model from fit_disease_model so it can be reused without retraining.
+
+    Args:
+        model: The dict returned by fit_disease_model.
+        path: The filepath to write to.
+    """
+    with open(path, 'wb') as f:
+        pickle.dump(model, f)
+
+
+def load_disease_model(path) -> dict:
+    """
+    Loads a model written by save_disease_model.
+
+    Args:
+        path: The filepath of the pickled model.
+
+    Returns:
+        dict: The fitted model (see fit_disease_model).
+    """
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def assign_disease(second_disease_df, aw_fb_df, model_path=None, min_exceedances=None) -> pd.DataFrame:
     """
     Use RandomForestClassifier and one-hot-encoding.
     Assign diseases to the aw_fb_df based on 2 conditions:
@@ -167,39 +455,25 @@ def assign_disease(second_disease_df, aw_fb_df) -> pd.DataFrame:
     Args:
         second_disease_df: A full DataFrame indicating whether a person may also be experience obesity / weight problems.
         aw_fb_df: A cleaned DataFrame of Apple Watch and FitBit data.
+        model_path: If given, the fitted model is saved here for the scoring service (see serve.py), with
+                    min_exceedances under the 'min_exceedances' key so rows scored later use the same rule.
+        min_exceedances: If given, condition 1 becomes a sustained one: exceed_roll_count >= min_exceedances
+                         (requires add_rolling_heart_features from process.py).
 
     Returns:
         pd.DataFrame: A combined DataFrame assigning the types of diseases a person may be suffering from.
     """
 
     try:
-        feature_cols = ['Sex', 'Age_Bin']
-        train_df = second_disease_df[second_disease_df['Obesity_Binary'] == 1].copy()
+        model = fit_disease_model(second_disease_df)
+        model['min_exceedances'] = min_exceedances
+        if model_path is not None:
+            save_disease_model(model, model_path)
 
-        X_train = pd.get_dummies(train_df[feature_cols])
-        y_train = train_df['Topic'] 
-
-        le_topic = LabelEncoder()
-        y_train_le = le_topic.fit_transform(y_train)
-
-        print("Training classifier for predicting disease...")
-        rfc_disease_clf = RandomForestClassifier(random_state=42, class_weight='balanced')
-        rfc_disease_clf.fit(X_train, y_train_le)
-
-        X_awfb = pd.get_dummies(aw_fb_df[feature_cols])
-        X_awfb = X_awfb.reindex(columns=X_train.columns, fill_value=0)
-        aw_fb_df['Possible_Disease'] = le_topic.inverse_transform(rfc_disease_clf.predict(X_awfb))
-        
-        def assign_topic(row):
-            if row['Disease'] == 1 and row['Possible Obesity'] == 1:
-                return row['Possible_Disease']
-            return None
-
-        print("Assigning whether disease should exist or not...")
-        aw_fb_df['Assigned_Disease'] = aw_fb_df.apply(assign_topic, axis=1)
+        aw_fb_df = apply_disease_model(model, aw_fb_df, min_exceedances=min_exceedances)
     
         print(f"Successfully assigned disease to aw_fb_df!")
         return aw_fb_df
     
     except Exception as e:
-        print(f"Disease could not be assigned to aw_fb_df: {e}")
\ No newline at end of file
+        print(f"Disease could not be assigned to aw_fb_df: {e}")
@@ -0,0 +1,488 @@
+import sys
+import time
+import argparse
+import subprocess
+import statistics
+import numpy as np
+import pandas as pd
+
+
+# --- 1. STARTUP / IMPORT TIME
+def bench_startup(modules=('main', 'process', 'augment', 'analyze'), repeats=5) -> dict:
+    """
+    Measures the wall-clock time of importing each module in a fresh interpreter.
+
+    Args:
+        modules: The module names to import (run from the src/ directory).
+        repeats: Number of fresh interpreters started per module.
+
+    Returns:
+        dict: Median import time in seconds per module, plus whether sklearn, matplotlib
+              or seaborn were pulled in by the import.
+    """
+    heavy = ['sklearn', 'matplotlib', 'seaborn']
+    code = (
+        "import sys, time\n"
+        "t = time.perf_counter()\n"
+        "import {module}\n"
+        "dt = time.perf_counter() - t\n"
+        "print(dt, ','.join(m for m in {heavy!r} if m in sys.modules))\n"
+    )
+
+    results = {}
+    for module in modules:
+        times = []
+        loaded = ''
+        for _ in range(repeats):
+            out = subprocess.run([sys.executable, '-c', code.format(module=module, heavy=heavy)],
+                                 capture_output=True, text=True, check=True).stdout.split()
+            times.append(float(out[0]))
+            loaded = out[1] if len(out) > 1 else ''
+        results[module] = {'median_s': statistics.median(times), 'heavy_modules_loaded': loaded or 'none'}
+        print(f"import {module}: {results[module]['median_s']:.3f}s (heavy modules loaded: {results[module]['heavy_modules_loaded']})")
+
+    return results
+
+
+# --- 2. SCORING SERVICE
+def _raw_aw_fb_rows(n_rows, seed=0) -> pd.DataFrame:
+    """Synthetic rows with the aw_fb_data.csv schema."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'device': rng.choice(['apple watch', 'fitbit'], n_rows),
+        'activity': rng.choice(['Lying', 'Sitting', 'Self Pace walk', 'Running 3 METs', 'Running 5 METs', 'Running 7 METs'], n_rows),
+        'gender': rng.integers(0, 2, n_rows),
+        'age': rng.integers(18, 80, n_rows),
+        'height': rng.normal(170, 10, n_rows).round(),
+        'weight': rng.normal(70, 12, n_rows).round(),
+        'hear_rate': rng.normal(90, 25, n_rows),
+        'sd_norm_heart': rng.gamma(2, 3, n_rows),
+        'resting_heart': rng.normal(65, 8, n_rows),
+        'intensity_karvonen': rng.uniform(0, 1, n_rows),
+    })
+
+
+def _toy_disease_model():
+    from augment import fit_disease_model
+    second_disease_df = pd.DataFrame({
+        'Sex': ['Female', 'Male', 'Female', 'Male', 'Female', 'Male'],
+        'Age_Bin': ['18-44', '18-44', '45-64', '45-64', '65+', '65+'],
+        'Obesity_Binary': [1] * 6,
+        'Topic': ['Arthritis', 'Asthma', 'Arthritis', 'Nutrition, Physical Activity, and Weight Status', 'Asthma', 'Arthritis'],
+    })
+    return fit_disease_model(second_disease_df)
+
+
+def bench_serve(clients=50, requests_per_client=20, rows_per_request=10) -> dict:
+    """
+    Drives an in-process ScoringService with concurrent clients.
+
+    Args:
+        clients: Number of concurrent clients.
+        requests_per_client: Requests sent sequentially by each client.
+        rows_per_request: Rows in each request.
+
+    Returns:
+        dict: ScoringService.stats() plus overall rows/sec.
+    """
+    import asyncio
+    from serve import ScoringService
+
+    rows = _raw_aw_fb_rows(rows_per_request).to_dict(orient='records')
+
+    async def run():
+        service = ScoringService(_toy_disease_model())
+        service.start()
+
+        async def client():
+            for _ in range(requests_per_client):
+                await service.score(rows)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[client() for _ in range(clients)])
+        elapsed = time.perf_counter() - start
+        await service.stop()
+        return service.stats(), elapsed
+
+    stats, elapsed = asyncio.run(run())
+    stats['rows_per_s'] = stats['rows'] / elapsed
+    print(f"{stats['requests']} requests in {stats['batches']} batches ({stats['mean_batch_rows']:.0f} rows/batch), "
+          f"{stats['rows_per_s']:.0f} rows/s, p50 {stats['p50_ms']:.1f}ms, p95 {stats['p95_ms']:.1f}ms, p99 {stats['p99_ms']:.1f}ms")
+    return stats
+
+
+# --- 3. STREAMING REPLAY
+def bench_stream(n_events=200_000, from_file=True) -> dict:
+    """
+    Replays synthetic readings through the StreamingDetector.
+
+    Args:
+        n_events: Number of readings replayed.
+        from_file: If True, readings are written to a CSV and replayed through follow_file
+                   (including CSV parsing, and alert latencies count the time since the file was
+                   written); otherwise dicts are fed directly.
+
+    Returns:
+        dict: The detector stats plus events/sec.
+    """
+    import os
+    import tempfile
+    from stream import StreamingDetector, follow_file
+
+    raw_df = _raw_aw_fb_rows(n_events)
+    detector = StreamingDetector(on_alert=lambda alert: None)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if from_file:
+            path = os.path.join(tmp, 'replay.csv')
+            raw_df.to_csv(path, index=False)
+            events = follow_file(path, poll_interval=0.01, idle_timeout=0.0)
+        else:
+            events = raw_df.to_dict(orient='records')
+
+        start = time.perf_counter()
+        stats = detector.run(events)
+        elapsed = time.perf_counter() - start
+
+    stats['events_per_s'] = stats['events'] / elapsed
+    print(f"{stats['events']} events, {stats['alerts']} alerts, {stats['participants']} participants tracked: "
+          f"{stats['events_per_s']:.0f} events/s, alert p99 {stats.get('p99_ms', 0):.3f}ms")
+    return stats
+
+
+# --- 4. ROLLING HEART RATE FEATURES
+def bench_rolling(n_rows=10_000_000, n_participants=50_000, window=10) -> dict:
+    """
+    Times add_rolling_heart_features on a synthetic cleaned aw_fb table.
+
+    Args:
+        n_rows: Number of readings.
+        n_participants: Number of distinct participants (each with 6 activities).
+        window: Rolling window size.
+
+    Returns:
+        dict: Seconds taken and rows/sec.
+    """
+    from process import add_rolling_heart_features
+
+    rng = np.random.default_rng(0)
+    participant = rng.integers(0, n_participants, n_rows)
+    aw_fb_cleaned = pd.DataFrame({
+        'Age': 18 + participant % 60,
+        'Height_cm': 150 + (participant // 60) % 50,
+        'Weight_kg': 50 + (participant // 3000) % 60,
+        'Sex': pd.Categorical.from_codes(participant % 2, ['Female', 'Male']),
+        'Device': pd.Categorical.from_codes(rng.integers(0, 2, n_rows), ['Apple Watch', 'Fitbit']),
+        'Activity': pd.Categorical.from_codes(rng.integers(0, 6, n_rows), ['Lying', 'Sitting', 'Self Pace walk', 'Running 3 METs', 'Running 5 METs', 'Running 7 METs']),
+        'heart_rate': rng.normal(90, 25, n_rows),
+        'Disease': rng.integers(0, 2, n_rows),
+    })
+
+    start = time.perf_counter()
+    add_rolling_heart_features(aw_fb_cleaned, window=window)
+    elapsed = time.perf_counter() - start
+
+    print(f"add_rolling_heart_features: {n_rows} rows, window {window}: {elapsed:.2f}s ({n_rows / elapsed:,.0f} rows/s)")
+    return {'seconds': elapsed, 'rows_per_s': n_rows / elapsed}
+
+
+# --- 5. RESULTS STORE
+def bench_store(n_rows=1_000_000, repeats=20) -> dict:
+    """
+    Publishes a synthetic final_results table to SQLite and times filtered queries against
+    reparsing the equivalent CSV.
+
+    Args:
+        n_rows: Number of result rows.
+        repeats: Queries timed per method.
+
+    Returns:
+        dict: Median seconds per method.
+    """
+    import os
+    import tempfile
+    from store import publish_results, count_cases, query_results
+
+    rng = np.random.default_rng(0)
+    full_df = pd.DataFrame({
+        'Device': rng.choice(['Apple Watch', 'Fitbit'], n_rows),
+        'Sex': rng.choice(['Female', 'Male'], n_rows),
+        'Age_Bin': rng.choice(['18-44', '45-64', '65+'], n_rows),
+        'BMI': rng.normal(25, 4, n_rows),
+        'heart_rate': rng.normal(90, 25, n_rows),
+        'Assigned_Disease': rng.choice(['Arthritis', 'Asthma', 'Nutrition, Physical Activity, and Weight Status', None], n_rows, p=[0.05, 0.03, 0.07, 0.85]),
+    })
+    filters = {'disease': 'Arthritis', 'sex': 'Female', 'age_bin': '45-64', 'device': 'Fitbit'}
+
+    def median_time(fn):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return statistics.median(times)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'results.db')
+        csv_path = os.path.join(tmp, 'final_results.csv')
+        full_df.to_csv(csv_path, index=False)
+        publish_results(full_df, db_path=db_path)
+
+        def from_csv():
+            df = pd.read_csv(csv_path)
+            return ((df['Assigned_Disease'] == 'Arthritis') & (df['Sex'] == 'Female') &
+                    (df['Age_Bin'] == '45-64') & (df['Device'] == 'Fitbit')).sum()
+
+        results = {
+            'csv_reparse_s': median_time(from_csv),
+            'count_cases_s': median_time(lambda: count_cases(db_path, **filters)),
+            'query_results_s': median_time(lambda: query_results(db_path, **filters)),
+        }
+
+    for name, seconds in results.items():
+        print(f"{name[:-2]}: {seconds * 1000:.2f}ms")
+    return results
+
+
+# --- 6. SHARED FEATURE MATRICES
+def bench_shared(n_rows=271_000, n_locations=55, n_topics=20, workers=(1, 2, 4), n_estimators=10) -> dict:
+    """
+    Compares per-worker private memory when fit workers receive pickled matrices versus
+    memory-mapped SharedMatrix handles. Peak RSS is also reported, but it counts the mapped
+    pages every worker shares, so the anonymous (private) memory is the number to compare.
+
+    Args:
+        n_rows: Rows of the synthetic training/apply matrices.
+        n_locations: Distinct LocationDesc values (one-hot columns).
+        n_topics: Distinct Topic values (one-hot columns).
+        workers: Worker counts to try (one fit task per worker).
+        n_estimators: Trees per forest (kept small; memory, not accuracy, is measured).
+
+    Returns:
+        dict: (mode, workers) -> max per-worker anonymous memory and peak RSS in MB, and wall-clock seconds.
+    """
+    from shared import FeatureMatrixStore, run_parallel_fits
+
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({
+        'YearStart': rng.integers(2011, 2022, n_rows),
+        'LocationDesc': rng.integers(0, n_locations, n_rows).astype(str),
+        'Topic': rng.integers(0, n_topics, n_rows).astype(str),
+    })
+    X = pd.get_dummies(frame).to_numpy(dtype=np.float32)
+    y = rng.integers(0, 3, n_rows)
+    print(f"Matrix: {X.shape[0]} x {X.shape[1]} float32 ({X.nbytes / 2**20:.0f} MB), used for training and applying")
+
+    results = {}
+    with FeatureMatrixStore() as store:
+        shared = {'X_train': store.put('X', X), 'y_train': store.put('y', y, dtype=np.int64)}
+        shared['X_apply'] = shared['X_train']
+
+        for mode, data in [('pickled', {'X_train': X, 'y_train': y, 'X_apply': X}), ('shared', shared)]:
+            for n_workers in workers:
+                tasks = [dict(data, name=i, params={'n_estimators': n_estimators, 'random_state': i})
+                         for i in range(n_workers)]
+                start = time.perf_counter()
+                fits = run_parallel_fits(tasks, max_workers=n_workers)
+                elapsed = time.perf_counter() - start
+                peak = max(fit['peak_rss_mb'] for fit in fits.values())
+                anonymous = max(fit['anonymous_mb'] or 0 for fit in fits.values())
+                results[(mode, n_workers)] = {'anonymous_mb': anonymous, 'peak_rss_mb': peak, 'seconds': elapsed}
+                print(f"{mode:>8}, {n_workers} workers: per-worker anonymous {anonymous:.0f} MB, peak RSS {peak:.0f} MB, {elapsed:.1f}s")
+
+    return results
+
+
+# --- 7. BACKGROUND ARTIFACT WRITER
+def bench_writer(n_rows=300_000, n_files=3, fit_rows=100_000) -> dict:
+    """
+    Times a pipeline-shaped loop (save a frame, then fit a forest) with blocking to_csv calls
+    versus the background ArtifactWriter.
+
+    Args:
+        n_rows: Rows of each frame saved.
+        n_files: Frames saved (each followed by a fit).
+        fit_rows: Rows of the forest fitted after each save.
+
+    Returns:
+        dict: Wall-clock seconds per mode and the writer's own report.
+    """
+    import os
+    import tempfile
+    from sklearn.ensemble import RandomForestClassifier
+    from writer import ArtifactWriter
+
+    frame = _raw_aw_fb_rows(n_rows)
+    rng = np.random.default_rng(0)
+    X_fit = rng.random((fit_rows, 20), dtype=np.float32)
+    y_fit = rng.integers(0, 3, fit_rows)
+
+    def next_stage():
+        RandomForestClassifier(n_estimators=10, random_state=42).fit(X_fit, y_fit)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        for i in range(n_files):
+            frame.to_csv(os.path.join(tmp, f"blocking_{i}.csv"), index=False)
+            next_stage()
+        results['blocking_s'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ArtifactWriter(background=True) as writer:
+            for i in range(n_files):
+                writer.write(frame, os.path.join(tmp, f"background_{i}.csv"), index=False)
+                next_stage()
+        results['background_s'] = time.perf_counter() - start
+        results['report'] = writer.report()
+
+    report = results['report']
+    print(f"blocking: {results['blocking_s']:.2f}s, background: {results['background_s']:.2f}s")
+    print(f"writer: {report['write_seconds']:.2f}s writing, pipeline waited {report['blocked_seconds']:.2f}s, "
+          f"time saved {report['seconds_saved']:.2f}s (wall-clock difference {results['blocking_s'] - results['background_s']:.2f}s)")
+    return results
+
+
+# --- 8. VECTORIZED POST-PROCESSING
+def bench_postprocess(n_rows=10_000_000, legacy_rows=200_000) -> dict:
+    """
+    Throughput and peak memory of process_aw_fb_data, apply_disease_model and analyze_assigned_diseases
+    on a wearable table of n_rows, with copy-on-write off and on. The row-wise apply they replaced is
+    timed on legacy_rows rows (it is too slow for the full table) and reported as rows/s.
+
+    Peak memory is traced with tracemalloc (NumPy and pandas buffers included) and excludes the inputs.
+
+    Args:
+        n_rows: Rows of the synthetic wearable table.
+        legacy_rows: Rows the row-wise apply versions are timed on.
+
+    Returns:
+        dict: step -> rows/s and peak MB.
+    """
+    import tracemalloc
+    from process import process_aw_fb_data
+    from augment import apply_disease_model
+    from analyze import analyze_assigned_diseases
+
+    raw = _raw_aw_fb_rows(n_rows)
+    raw['device'] = raw['device'].astype('category')
+    raw['activity'] = raw['activity'].astype('category')
+    model = _toy_disease_model()
+
+    def measure(name, fn, rows, trace=True):
+        # Tracing slows down Python object allocation, so the row-wise versions are timed untraced
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 2**20 if trace else None
+        tracemalloc.stop()
+        results[name] = {'rows_per_s': rows / elapsed, 'peak_mb': peak}
+        print(f"{name}: {rows / elapsed:,.0f} rows/s" + (f", peak {peak:,.0f} MB" if trace else ""))
+        return out
+
+    results = {}
+    cleaned = measure('process_aw_fb_data', lambda: process_aw_fb_data(raw), n_rows)
+    del raw
+    sample = cleaned.iloc[:legacy_rows]
+
+    # Row-wise versions replaced by the vectorized code
+    def legacy_disease():
+        return sample.apply(lambda row: 1 if (row['heart_rate'] > row['target_heart_rate'] + 2 * row['sd_norm_heart']) and
+                                             (row['heart_rate'] > row['target_heart_rate'] - 2 * row['sd_norm_heart']) else 0, axis=1)
+
+    def legacy_assign():
+        scored = sample.assign(Possible_Disease='Arthritis')
+        return scored.apply(lambda row: row['Possible_Disease'] if row['Disease'] == 1 and row['Possible Obesity'] == 1 else None, axis=1)
+
+    measure('legacy Disease apply', legacy_disease, legacy_rows, trace=False)
+    measure('legacy Assigned_Disease apply', legacy_assign, legacy_rows, trace=False)
+
+    for copy_on_write in (False, True):
+        with pd.option_context('mode.copy_on_write', copy_on_write):
+            mode = 'copy-on-write' if copy_on_write else 'default'
+            full_df = measure(f"apply_disease_model ({mode})", lambda: apply_disease_model(model, cleaned), n_rows)
+            measure(f"analyze_assigned_diseases ({mode})", lambda: analyze_assigned_diseases(full_df), n_rows)
+            del full_df
+
+    return results
+
+
+# --- 9. CHANGE DETECTION
+def bench_changes(n_rows=1_000_000, changed_share=0.01) -> dict:
+    """
+    Times building the change index of a surveillance-shaped table and diffing a refresh in which
+    changed_share of the rows were updated, inserted and deleted each.
+
+    Args:
+        n_rows: Rows of the synthetic table.
+        changed_share: Share of rows updated (and of rows inserted and deleted).
+
+    Returns:
+        dict: Seconds for the first refresh and the diff, and the rows found per kind.
+    """
+    import tempfile
+    from changes import detect_changes
+
+    rng = np.random.default_rng(0)
+    key_cols = ['YearStart', 'LocationDesc', 'QuestionID', 'StratificationID1']
+    # Unique keys, as in the published data: each row is one year x location x question x stratification
+    row = rng.permutation(n_rows)
+    old_df = pd.DataFrame({
+        'YearStart': 2011 + row % 11,
+        'LocationDesc': np.array([f"Location{i}" for i in range(55)])[row // 11 % 55],
+        'QuestionID': np.array([f"Q{i:04d}" for i in range(n_rows // 4840 + 1)])[row // 4840],
+        'StratificationID1': np.array(['MALE', 'FEMALE', 'AGE1844', 'AGE4564', 'AGE65', 'WHT', 'BLK', 'HIS'])[row // 605 % 8],
+        'Topic': rng.choice(['Asthma', 'Arthritis', 'Diabetes', 'Obesity / Weight Status'], n_rows),
+        'Data_Value': rng.normal(30, 10, n_rows).round(1),
+        'Sample_Size': rng.integers(50, 5000, n_rows),
+    })
+
+    n_changed = int(n_rows * changed_share)
+    new_df = old_df.iloc[n_changed:].copy()
+    new_df.iloc[:n_changed, new_df.columns.get_loc('Data_Value')] += 1
+    new_df = pd.concat([new_df, old_df.iloc[:n_changed].assign(YearStart=2030)], ignore_index=True)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        detect_changes(old_df, 'bench', key_cols, index_dir=tmp)
+        results['first_refresh_s'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        changes = detect_changes(new_df, 'bench', key_cols, index_dir=tmp)
+        results['diff_s'] = time.perf_counter() - start
+
+    results.update(inserted=len(changes.inserted), updated=len(changes.updated), deleted=len(changes.deleted))
+    print(f"{n_rows} rows: first refresh {results['first_refresh_s']:.2f}s, diff {results['diff_s']:.2f}s "
+          f"({results['inserted']} inserted, {results['updated']} updated, {results['deleted']} deleted)")
+    return results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Performance benchmarks for the pipeline.")
+    parser.add_argument('benchmark', choices=['startup', 'serve', 'stream', 'rolling', 'store', 'shared', 'writer', 'postprocess', 'changes'])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=10_000_000, help="Rows for the rolling and postprocess benchmarks.")
+    args = parser.parse_args()
+
+    if args.benchmark == 'startup':
+        bench_startup(repeats=args.repeats)
+    elif args.benchmark == 'serve':
+        bench_serve()
+    elif args.benchmark == 'stream':
+        bench_stream()
+    elif args.benchmark == 'rolling':
+        bench_rolling(n_rows=args.rows)
+    elif args.benchmark == 'store':
+        bench_store()
+    elif args.benchmark == 'shared':
+        bench_shared()
+    elif args.benchmark == 'writer':
+        bench_writer()
+    elif args.benchmark == 'postprocess':
+        bench_postprocess(n_rows=args.rows)
+    elif args.benchmark == 'changes':
+        bench_changes()
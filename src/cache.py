@@ -0,0 +1,192 @@
+import sys
+import functools
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import process as _process
+import augment as _augment
+import analyze as _analyze
+from config import CACHE_MAX_MB
+
+
+# --- 1. FINGERPRINTS AND SIZES
+def fingerprint(obj):
+    """
+    A hashable key for a function argument. DataFrames and Series are keyed by their shape, labels,
+    dtypes and a vectorized hash of their values and index, so an edited frame never hits a stale entry.
+
+    Args:
+        obj: A DataFrame, Series, array, tuple/list/dict of those, or any hashable value.
+
+    Returns:
+        A hashable key.
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        hashes = pd.util.hash_pandas_object(obj, index=True).to_numpy()
+        columns = tuple(obj.columns) if isinstance(obj, pd.DataFrame) else (obj.name,)
+        dtypes = tuple(map(str, obj.dtypes)) if isinstance(obj, pd.DataFrame) else (str(obj.dtype),)
+        # Sum and a position-weighted sum, so reordered rows give a different key
+        weights = np.arange(1, len(hashes) + 1, dtype=np.uint64)
+        return (type(obj).__name__, obj.shape, columns, dtypes, int(hashes.sum()), int((hashes * weights).sum()))
+    if isinstance(obj, np.ndarray):
+        return ('ndarray', obj.shape, str(obj.dtype), obj.tobytes())
+    if isinstance(obj, (tuple, list)):
+        return (type(obj).__name__,) + tuple(fingerprint(item) for item in obj)
+    if isinstance(obj, dict):
+        return ('dict',) + tuple(sorted((key, fingerprint(value)) for key, value in obj.items()))
+    return obj
+
+
+def size_of(obj) -> int:
+    """Approximate bytes held by a cached result (deep for DataFrames, Series and containers)."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=True, deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (tuple, list)):
+        return sys.getsizeof(obj) + sum(size_of(item) for item in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(size_of(value) for value in obj.values())
+    return sys.getsizeof(obj)
+
+
+def _copy(obj):
+    """Copies DataFrames/Series (also inside tuples) so callers cannot modify a cached result."""
+    if isinstance(obj, (pd.DataFrame, pd.Series, np.ndarray)):
+        return obj.copy()
+    if isinstance(obj, tuple):
+        return tuple(_copy(item) for item in obj)
+    return obj
+
+
+# --- 2. SIZE-AWARE LRU CACHE
+class ResultCache:
+    """
+    An in-memory least-recently-used cache of function results, bounded by their total size in
+    bytes rather than by a number of entries. Results larger than the whole cap are not stored.
+    """
+
+    def __init__(self, max_mb=CACHE_MAX_MB):
+        """
+        Args:
+            max_mb: The memory cap for all cached results, in MB.
+        """
+        self.max_bytes = int(max_mb * 2**20)
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns a copy of the cached result for key, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return _copy(entry[0])
+
+    def put(self, key, result):
+        """Stores a copy of result under key, evicting least recently used results to stay under the cap."""
+        size = size_of(result)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.bytes -= self._entries.pop(key)[1]
+        while self._entries and self.bytes + size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+        self._entries[key] = (_copy(result), size)
+        self.bytes += size
+
+    def clear(self):
+        """Drops every cached result (the statistics are kept)."""
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: hits, misses, hit_rate, evictions, entries and the MB used out of max_mb.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'mb': self.bytes / 2**20,
+            'max_mb': self.max_bytes / 2**20,
+        }
+
+
+RESULT_CACHE = ResultCache()
+
+
+def cached(fn, cache=None, state=None):
+    """
+    Memoizes fn in a ResultCache, keyed by fn's name and the fingerprints of its arguments.
+    Both the stored result and every returned result are copies, so neither the caller nor fn can
+    change a cached entry. None (the pipeline's failure value) is never cached.
+
+    Args:
+        fn: The function to memoize.
+        cache: The ResultCache to use (default: the shared RESULT_CACHE).
+        state: Optional callable returning module state the result also depends on
+               (e.g. the classifier parameters), added to the key.
+
+    Returns:
+        The memoized function, with .cache pointing at its ResultCache.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        store = wrapper.cache
+        key = (fn.__module__, fn.__qualname__, fingerprint(args), fingerprint(kwargs),
+               fingerprint(state()) if state is not None else None)
+        result = store.get(key)
+        if result is None:
+            result = fn(*args, **kwargs)
+            if result is not None:
+                store.put(key, result)
+        return result
+
+    wrapper.cache = RESULT_CACHE if cache is None else cache
+    return wrapper
+
+
+# --- 3. CACHED PIPELINE FUNCTIONS
+# Drop-in replacements for notebooks, e.g. `from cache import process_nutri_data, predict_sex_age_nutri`.
+# assign_disease's model_path is only written on a miss.
+def _forest_params() -> dict:
+    """The classifier parameters in effect, so tuned and default parameters are cached apart."""
+    return {name: _augment.forest_params(name) for name in _augment.FOREST_DEFAULTS}
+
+
+process_aw_fb_data = cached(_process.process_aw_fb_data)
+add_rolling_heart_features = cached(_process.add_rolling_heart_features)
+process_nutri_data = cached(_process.process_nutri_data)
+process_chronic_data = cached(_process.process_chronic_data)
+predict_sex_age_nutri = cached(_augment.predict_sex_age_nutri, state=_forest_params)
+predict_sex_age_chronic = cached(_augment.predict_sex_age_chronic, state=_forest_params)
+predict_obesity = cached(_augment.predict_obesity, state=_forest_params)
+assign_disease = cached(_augment.assign_disease, state=_forest_params)
+analyze_assigned_diseases = cached(_analyze.analyze_assigned_diseases)
+
+
+def cache_stats() -> dict:
+    """Hit/miss statistics of the shared cache (see ResultCache.stats)."""
+    return RESULT_CACHE.stats()
+
+
+def clear_cache():
+    """Drops every result in the shared cache."""
+    RESULT_CACHE.clear()
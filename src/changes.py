@@ -0,0 +1,174 @@
+import os
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+from config import CHANGE_INDEX_DIR
+
+
+class ChangeSet(NamedTuple):
+    """
+    Rows that changed between the last indexed version of a dataset and the new one.
+    inserted and updated are rows of the new DataFrame (with its index); deleted holds only the key
+    columns of the removed rows, since the index does not keep their other values. index is the new
+    version's change index, to be stored with save_index once that version has been saved.
+    """
+    inserted: pd.DataFrame
+    updated: pd.DataFrame
+    deleted: pd.DataFrame
+    unchanged: int
+    index: pd.DataFrame = None
+
+    @property
+    def changed(self) -> int:
+        return len(self.inserted) + len(self.updated) + len(self.deleted)
+
+
+# --- 1. ROW HASHES
+def _hash_frame(df) -> np.ndarray:
+    """
+    Vectorized 64-bit hash of each row's values. Columns are taken in name order and numbers are
+    hashed as float64, so reordered columns or an int column turning float (e.g. after a new missing
+    value) do not mark every row as updated.
+    """
+    normalized = {}
+    for col in sorted(df.columns, key=str):
+        values = df[col]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            values = values.astype('float64')
+        normalized[col] = values.to_numpy()
+    return pd.util.hash_pandas_object(pd.DataFrame(normalized), index=False).to_numpy()
+
+
+def row_index(df, key_cols) -> pd.DataFrame:
+    """
+    Builds the change index of a DataFrame: one row per row of df with its key columns, a key hash
+    and a row hash. Rows sharing a key are told apart by their order of appearance within that key,
+    so if one of them is deleted, the ones after it show up as updated.
+
+    Args:
+        df: A loaded dataset (e.g. nutri_df or chronic_df).
+        key_cols: Columns identifying a row across publications (see config.CHANGE_KEYS).
+
+    Returns:
+        pd.DataFrame: The key columns plus '_key_hash' and '_row_hash' (uint64).
+    """
+    keys = df[key_cols].reset_index(drop=True)
+    occurrence = keys.groupby(key_cols, sort=False, dropna=False).cumcount()
+    return keys.assign(
+        _key_hash=_hash_frame(keys.assign(_occurrence=occurrence.to_numpy())),
+        _row_hash=_hash_frame(df),
+    )
+
+
+def key_columns(df, key_cols) -> list:
+    """
+    The configured key columns present in df. If none are present, every column is used, so an
+    edited row shows up as one deletion and one insertion instead of an update.
+    """
+    present = [col for col in key_cols if col in df.columns]
+    missing = [col for col in key_cols if col not in df.columns]
+    if missing:
+        print(f"Key columns not in the data and left out of the change index: {missing}")
+    return present or list(df.columns)
+
+
+# --- 2. CHANGES BETWEEN REFRESHES
+def _index_path(name, index_dir) -> str:
+    return os.path.join(index_dir, f"{name}_rows.pkl")
+
+
+def diff_index(old_index, new_index, df) -> ChangeSet:
+    """
+    Compares two change indexes.
+
+    Args:
+        old_index: The row_index of the previous version (None if there is none).
+        new_index: The row_index of df.
+        df: The new version of the dataset.
+
+    Returns:
+        ChangeSet: The inserted, updated and deleted rows.
+    """
+    key_cols = [col for col in new_index.columns if not col.startswith('_')]
+    if old_index is None:
+        return ChangeSet(df, df.iloc[:0], new_index[key_cols].iloc[:0], 0, new_index)
+
+    old_keys = pd.Index(old_index['_key_hash'].to_numpy())
+    position = old_keys.get_indexer(new_index['_key_hash'].to_numpy())
+    matched = position >= 0
+    updated = matched.copy()
+    updated[matched] = old_index['_row_hash'].to_numpy()[position[matched]] != new_index['_row_hash'].to_numpy()[matched]
+    deleted = ~old_keys.isin(new_index['_key_hash'].to_numpy())
+
+    return ChangeSet(
+        inserted=df[~matched],
+        updated=df[updated],
+        deleted=old_index.loc[deleted, [col for col in key_cols if col in old_index.columns]],
+        unchanged=int(matched.sum() - updated.sum()),
+        index=new_index,
+    )
+
+
+def detect_changes(df, name, key_cols, index_dir=CHANGE_INDEX_DIR, save=True) -> ChangeSet:
+    """
+    Finds the rows of df inserted, updated or deleted since the last stored index of the same dataset
+    name, and (by default) stores df's change index for the next call. On the first call every row is
+    inserted. When df is saved afterwards, pass save=False and call save_index once the save succeeded,
+    so a failed save is detected as changed again on the next refresh.
+
+    Args:
+        df: The newly loaded dataset.
+        name: The dataset name, e.g. 'nutri' or 'chronic'.
+        key_cols: Columns identifying a row across publications.
+        index_dir: Where change indexes are stored.
+        save: Whether to replace the stored index with df's.
+
+    Returns:
+        ChangeSet: The changes, or None if they could not be computed.
+    """
+    try:
+        print(f"Detecting changes in {name} data...")
+        new_index = row_index(df, key_columns(df, key_cols))
+        path = _index_path(name, index_dir)
+        old_index = pd.read_pickle(path) if os.path.exists(path) else None
+        changes = diff_index(old_index, new_index, df)
+
+        if save:
+            save_index(changes, name, index_dir)
+
+        print(f"{name}: {len(changes.inserted)} inserted, {len(changes.updated)} updated, "
+              f"{len(changes.deleted)} deleted, {changes.unchanged} unchanged rows.")
+        return changes
+
+    except Exception as e:
+        print(f"Could not detect changes in {name} data: {e}")
+
+
+def save_index(changes, name, index_dir=CHANGE_INDEX_DIR):
+    """
+    Stores the change index of a ChangeSet as the last indexed version of the dataset name.
+
+    Args:
+        changes: A ChangeSet from detect_changes.
+        name: The dataset name passed to detect_changes.
+        index_dir: Where change indexes are stored.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    changes.index.to_pickle(_index_path(name, index_dir))
+
+
+def touched(changes, by) -> list:
+    """
+    The values of a column (e.g. 'LocationDesc') that have an inserted, updated or deleted row, so
+    downstream steps can redo only those groups or partitions (main.py passes them to
+    process_partitioned as `changed`).
+
+    Args:
+        changes: A ChangeSet from detect_changes.
+        by: A key column (deleted rows only keep their key columns).
+
+    Returns:
+        list: The sorted touched values.
+    """
+    values = pd.concat([changes.inserted[by], changes.updated[by], changes.deleted[by]])
+    return sorted(values.dropna().unique().tolist())
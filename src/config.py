@@ -5,4 +5,53 @@ RESULTS_DIR = "../results"
 # Data Sources
 AWFB_DATA = '../data/aw_fb_data.csv'
 NUTRI_DATA = '../data/Nutrition__Physical_Activity__and_Obesity_-_Behavioral_Risk_Factor_Surveillance_System.csv'
-EXTERNAL_DATA_URL = 'https://data.cdc.gov/api/views/hksd-2xuw/rows.csv?accessType=DOWNLOAD'
\ No newline at end of file
+EXTERNAL_DATA_URL = 'https://data.cdc.gov/api/views/hksd-2xuw/rows.csv?accessType=DOWNLOAD'
+
+# Fitted models
+DISEASE_MODEL = '../results/disease_model.pkl'
+
+# Scoring service (serve.py)
+SERVE_HOST = '127.0.0.1'
+SERVE_PORT = 8510
+
+# Rolling heart rate features (process.add_rolling_heart_features)
+ROLLING_WINDOW = 10
+# Flagged readings per window needed to assign a disease; None uses each reading's own Disease flag
+MIN_EXCEEDANCES = None
+
+# Indexed query store for final results (store.py)
+RESULTS_DB = '../results/final_results.db'
+
+# On-disk partitions of the surveillance data (partition.py)
+PARTITION_DIR = '../data/partitions'
+PARTITION_BY = 'LocationDesc'
+
+# Hyperparameter tuning (tune.py)
+TUNE_CACHE_DIR = '../data/encoded'
+TUNING_RESULTS = '../results/tuning_results.csv'
+TUNED_PARAMS = '../results/tuned_params.json'
+
+# Background artifact writer (writer.py): frames that may wait to be written before the pipeline blocks
+ARTIFACT_QUEUE_SIZE = 2
+# Write in the background: True, False, or None for only when there is more than one CPU (on one CPU the
+# writer thread competes with the pipeline and measured slower than writing in place)
+ARTIFACT_BACKGROUND = None
+
+# In-memory result cache for notebooks (cache.py)
+CACHE_MAX_MB = 1024
+
+# Row-level change detection between refreshes (changes.py)
+CHANGE_INDEX_DIR = '../data/change_index'
+# Columns identifying a row across publications of each dataset
+CHANGE_KEYS = {
+    'nutri': ['YearStart', 'YearEnd', 'LocationDesc', 'QuestionID', 'StratificationCategoryId1', 'StratificationID1'],
+    'chronic': ['YearStart', 'YearEnd', 'LocationDesc', 'QuestionID', 'DataValueTypeID', 'StratificationCategoryID1', 'StratificationID1'],
+}
+
+# Approximate aggregates of streamed results (sketch.py)
+RESULT_SKETCH = '../results/results_sketch.json'
+# Count-min: counts overestimate by at most CMS_EPSILON x total count, except with probability CMS_DELTA
+CMS_EPSILON = 0.001
+CMS_DELTA = 0.01
+# Quantile sketches: relative error of every BMI/heart rate quantile
+QUANTILE_ACCURACY = 0.01
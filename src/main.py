@@ -1,57 +1,313 @@
 import os
-from config import DATA_DIR, RESULTS_DIR, AWFB_DATA, NUTRI_DATA, EXTERNAL_DATA_URL
+import argparse
+import functools
+import pandas as pd
+from config import DATA_DIR, RESULTS_DIR, AWFB_DATA, NUTRI_DATA, EXTERNAL_DATA_URL, DISEASE_MODEL, SERVE_HOST, SERVE_PORT, ROLLING_WINDOW, MIN_EXCEEDANCES, RESULTS_DB, PARTITION_DIR, PARTITION_BY, TUNED_PARAMS, CHANGE_KEYS, RESULT_SKETCH
 from load import get_csv, get_chronic_data
-from process import process_aw_fb_data, process_chronic_data, process_nutri_data
-from augment import predict_sex_age_nutri, predict_sex_age_chronic, predict_obesity, assign_disease
-from analyze import analyze_aw_fb_data, analyze_chronic_data, analyze_nutri_data, analyze_assigned_diseases, plot_disease_results, analyze_dem_info
+from process import process_aw_fb_data, add_rolling_heart_features, process_chronic_data, process_nutri_data
+from augment import predict_sex_age_nutri, predict_sex_age_chronic, predict_sex_age_parallel, predict_obesity, assign_disease, load_disease_model, apply_disease_model, load_forest_params, budget_reports
+from store import publish_results
+from writer import ArtifactWriter, print_report
+from changes import detect_changes, save_index, touched
+from sketch import ResultSketch, save_sketch, load_sketches
+from partition import write_partitions, process_partitioned
+from analyze import analyze_aw_fb_data, analyze_chronic_data, analyze_nutri_data, analyze_assigned_diseases, plot_disease_results, analyze_dem_info, plot_sketch_results
 
-if __name__ == "__main__":
 
-    # Creating Directories
-    os.makedirs(DATA_DIR, exist_ok=True)
-    os.makedirs(RESULTS_DIR, exist_ok=True)
+def refresh_data(writer=None, changes=None) -> tuple:
+    """
+    Loads all three data sources and stores the loaded copies in DATA_DIR.
+    Rows inserted, updated or deleted since the last refresh of the surveillance data are reported
+    (see changes.py), and its stored copy is only rewritten if something changed. The change index is
+    only stored once that copy was written, so a failed write is retried on the next refresh.
+    Does not import scikit-learn, matplotlib or seaborn.
 
-    # --- 1. Load data ---
+    Args:
+        writer: If given, the ArtifactWriter that saves the copies (in the background with more than one CPU).
+        changes: If given, a dict that receives the nutri and chronic ChangeSets (None if they could not be computed).
+
+    Returns:
+        tuple: (aw_fb_df, nutri_df, chronic_df)
+    """
     print("Loading data...")
     aw_fb_df = get_csv(AWFB_DATA)
     nutri_df = get_csv(NUTRI_DATA)
     chronic_df = get_chronic_data(url = EXTERNAL_DATA_URL)
-    
-    aw_fb_df.to_csv(os.path.join(DATA_DIR, 'aw_fb_data_loaded.csv'), index=False)
-    nutri_df.to_csv(os.path.join(DATA_DIR, 'nutri_data_loaded.csv'), index=False)
-    chronic_df.to_csv(os.path.join(DATA_DIR, 'chronic_data_loaded.csv'), index=False)
+
+    def save(df, path, on_written=None, **kwargs):
+        if writer is not None:
+            return writer.write(df, path, on_written=on_written, **kwargs)
+        df.to_csv(path, **kwargs)
+        if on_written is not None:
+            on_written()
+
+    save(aw_fb_df, os.path.join(DATA_DIR, 'aw_fb_data_loaded.csv'), index=False)
+    for name, df in [('nutri', nutri_df), ('chronic', chronic_df)]:
+        path = os.path.join(DATA_DIR, f'{name}_data_loaded.csv')
+        changeset = detect_changes(df, name, CHANGE_KEYS[name], save=False)
+        if changes is not None:
+            changes[name] = changeset
+        if changeset is None:
+            save(df, path, index=False)
+        elif changeset.changed or not os.path.exists(path):
+            save(df, path, on_written=functools.partial(save_index, changeset, name), index=False)
+        else:
+            print(f"{name} data unchanged since the last refresh; keeping {path}.")
+
+    return aw_fb_df, nutri_df, chronic_df
+
+
+def run_pipeline(plots=True, workers=None, partitioned=False, partition_values=None, max_rows=None, time_budget=None):
+    """
+    Runs the project from start to finish.
+
+    Args:
+        plots: If False, EDA and result plots are skipped and matplotlib/seaborn are never imported.
+        workers: If given, the four Sex/Age Bin classifiers are fitted in this many worker processes
+                 over shared memory-mapped feature matrices (or, with partitioned, the number of
+                 partitions processed at once).
+        partitioned: If True, the surveillance data is sharded by PARTITION_BY and each partition is
+                     processed and imputed in parallel; only the partitions with rows changed since the
+                     last refresh are recomputed, the others are reused from disk.
+                     The nutri/chronic EDA plots need the unsplit data and are skipped.
+        partition_values: With partitioned, only these partitions (e.g. LocationDesc values) are used.
+        max_rows: If given, the chronic Sex/Age Bin and obesity classifiers are fitted on stratified samples of at most this many rows
+                  (with partitioned, per partition).
+        time_budget: If given, those classifiers are fitted on stratified samples sized to take about this many seconds each.
+    """
+    # Loaded data and results are saved in the background while the next stage runs (with more than one CPU, see writer.py)
+    with ArtifactWriter() as writer:
+        _run_stages(writer, plots, workers, partitioned, partition_values, max_rows, time_budget)
+    print_report(writer.report())
+
+
+def _run_stages(writer, plots, workers, partitioned, partition_values, max_rows, time_budget):
+    """The stages of run_pipeline; CSV artifacts are handed to `writer`."""
+    # --- 1. Load data ---
+    changes = {}
+    aw_fb_df, nutri_df, chronic_df = refresh_data(writer, changes=changes)
 
     # --- 2. Process data ---
     print("Processing data...")
     aw_fb_cleaned = process_aw_fb_data(aw_fb_df)
-    nutri_sex_df, nutri_age_df, nutri_race_df = process_nutri_data(nutri_df)
-    chronic_age_df, chronic_race_df, chronic_sex_df = process_chronic_data(chronic_df)
-    
-    # --- 3. Conduct EDA ---
-    print("Conducting EDA...")
-    analyze_aw_fb_data(aw_fb_cleaned, save_dir=RESULTS_DIR)
-    analyze_nutri_data(nutri_sex_df, nutri_age_df, nutri_race_df, save_dir=RESULTS_DIR)
-    analyze_chronic_data(chronic_age_df, chronic_race_df, chronic_sex_df, save_dir=RESULTS_DIR)
-    
-    # --- 4. Augment/Engineer features ---
-    print("Engineering features and using RandomForestClassifer...")
-    nutri_combined = predict_sex_age_nutri(nutri_sex_df, nutri_age_df, nutri_race_df)
-    chronic_combined = predict_sex_age_chronic(chronic_sex_df, chronic_age_df, chronic_race_df)
-    
-    nutri_combined.to_csv(os.path.join(RESULTS_DIR, 'nutri_combined.csv'), index=False)
-    chronic_combined.to_csv(os.path.join(RESULTS_DIR, 'chronic_combined.csv'), index=False)
+    aw_fb_cleaned = add_rolling_heart_features(aw_fb_cleaned, window=ROLLING_WINDOW)
+
+    if partitioned:
+        # --- 2-4. Process and impute each partition of the surveillance data ---
+        nutri_dir = os.path.join(PARTITION_DIR, 'nutri')
+        chronic_dir = os.path.join(PARTITION_DIR, 'chronic')
+        write_partitions(nutri_df, nutri_dir, by=PARTITION_BY)
+        write_partitions(chronic_df, chronic_dir, by=PARTITION_BY)
+
+        if plots:
+            print("Conducting EDA...")
+            analyze_aw_fb_data(aw_fb_cleaned, save_dir=RESULTS_DIR)
+
+        print("Engineering features and using RandomForestClassifer on each partition...")
+        # Partitions with rows changed since the last refresh; None (changes unknown) falls back to the shard hashes
+        changed = {name: None if changes.get(name) is None else touched(changes[name], PARTITION_BY) for name in ('nutri', 'chronic')}
+        nutri_combined = process_partitioned(nutri_dir, 'nutri', values=partition_values, changed=changed['nutri'], max_workers=workers)
+        chronic_combined = process_partitioned(chronic_dir, 'chronic', values=partition_values, changed=changed['chronic'],
+                                               max_workers=workers, max_rows=max_rows, time_budget=time_budget)
+        if nutri_combined is None or chronic_combined is None:
+            raise RuntimeError("Partitioned imputation failed; see the messages above.")
+
+    else:
+        nutri_sex_df, nutri_age_df, nutri_race_df = process_nutri_data(nutri_df)
+        chronic_age_df, chronic_race_df, chronic_sex_df = process_chronic_data(chronic_df)
+
+        # --- 3. Conduct EDA ---
+        if plots:
+            print("Conducting EDA...")
+            analyze_aw_fb_data(aw_fb_cleaned, save_dir=RESULTS_DIR)
+            analyze_nutri_data(nutri_sex_df, nutri_age_df, nutri_race_df, save_dir=RESULTS_DIR)
+            analyze_chronic_data(chronic_age_df, chronic_race_df, chronic_sex_df, save_dir=RESULTS_DIR)
+
+        # --- 4. Augment/Engineer features ---
+        print("Engineering features and using RandomForestClassifer...")
+        if workers:
+            nutri_combined, chronic_combined = predict_sex_age_parallel(nutri_sex_df, nutri_age_df, nutri_race_df,
+                                                                        chronic_sex_df, chronic_age_df, chronic_race_df,
+                                                                        max_workers=workers, max_rows=max_rows, time_budget=time_budget)
+        else:
+            nutri_combined = predict_sex_age_nutri(nutri_sex_df, nutri_age_df, nutri_race_df)
+            chronic_combined = predict_sex_age_chronic(chronic_sex_df, chronic_age_df, chronic_race_df,
+                                                       max_rows=max_rows, time_budget=time_budget)
+
+    writer.write(nutri_combined, os.path.join(RESULTS_DIR, 'nutri_combined.csv'), index=False)
+    writer.write(chronic_combined, os.path.join(RESULTS_DIR, 'chronic_combined.csv'), index=False)
 
     # --- 5. Predict obesity and assign secondary diseases
     print("Predicting Chronic Disease")
-    second_disease_df = predict_obesity(nutri_combined, chronic_combined)
-    full_df = assign_disease(second_disease_df, aw_fb_cleaned)
+    second_disease_df = predict_obesity(nutri_combined, chronic_combined, max_rows=max_rows, time_budget=time_budget)
+    full_df = assign_disease(second_disease_df, aw_fb_cleaned, model_path=DISEASE_MODEL, min_exceedances=MIN_EXCEEDANCES)
+
+    writer.write(full_df, os.path.join(RESULTS_DIR, 'final_results.csv'), index=False)
+    publish_results(full_df, db_path=RESULTS_DB)
 
-    full_df.to_csv(os.path.join(RESULTS_DIR, 'final_results.csv'), index=False)
+    # Sketch of the results that later `score` batches are merged into (see sketch_report)
+    result_sketch = ResultSketch()
+    result_sketch.update(full_df)
+    save_sketch(result_sketch, RESULT_SKETCH)
 
     # --- 6. Analyze and plot results ---
-    print("Plotting results...")
     disease_counts, disease_sex, disease_age = analyze_assigned_diseases(full_df)
-    analyze_dem_info(full_df, save_dir=RESULTS_DIR)
-    plot_disease_results(disease_counts, disease_sex, disease_age, save_dir=RESULTS_DIR)
-    
-    print("\n--- Data collection and plotting complete. Check the `data` and 'results' directory. ---")
\ No newline at end of file
+    if plots:
+        print("Plotting results...")
+        analyze_dem_info(full_df, save_dir=RESULTS_DIR)
+        plot_disease_results(disease_counts, disease_sex, disease_age, save_dir=RESULTS_DIR)
+
+
+def tune_classifiers(tolerance=0.0):
+    """
+    Tunes tree count, depth and leaf size of every classifier with successive halving (see tune.py)
+    and saves the chosen parameters to TUNED_PARAMS for `python main.py --tuned`.
+
+    Args:
+        tolerance: Accuracy given up for a cheaper model when choosing parameters.
+    """
+    from tune import tuning_datasets, tune_all
+
+    aw_fb_df, nutri_df, chronic_df = refresh_data()
+    nutri_sex_df, nutri_age_df, nutri_race_df = process_nutri_data(nutri_df)
+    chronic_age_df, chronic_race_df, chronic_sex_df = process_chronic_data(chronic_df)
+
+    nutri_combined = predict_sex_age_nutri(nutri_sex_df, nutri_age_df, nutri_race_df)
+    chronic_combined = predict_sex_age_chronic(chronic_sex_df, chronic_age_df, chronic_race_df)
+    second_disease_df = predict_obesity(nutri_combined, chronic_combined)
+
+    datasets = tuning_datasets(nutri_sex_df, nutri_age_df, chronic_sex_df, chronic_age_df, nutri_combined, second_disease_df)
+    tune_all(datasets, tolerance=tolerance)
+
+
+def report_budget(max_rows=None, time_budget=None):
+    """
+    Reports the accuracy and agreement lost by fitting on a row or time budget instead of all rows,
+    and saves it to RESULTS_DIR/budget_report.csv.
+
+    Args:
+        max_rows: The row budget to evaluate.
+        time_budget: The time budget (seconds per classifier) to evaluate.
+    """
+    aw_fb_df, nutri_df, chronic_df = refresh_data()
+    nutri_sex_df, nutri_age_df, nutri_race_df = process_nutri_data(nutri_df)
+    chronic_age_df, chronic_race_df, chronic_sex_df = process_chronic_data(chronic_df)
+
+    nutri_combined = predict_sex_age_nutri(nutri_sex_df, nutri_age_df, nutri_race_df)
+    chronic_combined = predict_sex_age_chronic(chronic_sex_df, chronic_age_df, chronic_race_df)
+
+    report = budget_reports(chronic_sex_df, chronic_age_df, chronic_race_df, nutri_combined, chronic_combined,
+                            max_rows=max_rows, time_budget=time_budget)
+    print(report.to_string(index=False))
+    report.to_csv(os.path.join(RESULTS_DIR, 'budget_report.csv'), index=False)
+
+
+def score_only(input_path, output_path):
+    """
+    Assigns diseases to new Apple Watch/Fitbit rows with the model saved by a previous full run,
+    and adds them to the result sketch at RESULT_SKETCH. No classifier is retrained and nothing is plotted.
+    If that run used MIN_EXCEEDANCES, the same rule is applied over rolling windows of input_path's
+    readings (earlier files are not part of the windows).
+
+    Args:
+        input_path: A CSV file with the aw_fb_data.csv schema.
+        output_path: Where to write the scored rows.
+    """
+    aw_fb_df = get_csv(input_path)
+    aw_fb_cleaned = process_aw_fb_data(aw_fb_df)
+
+    print(f"Scoring with {DISEASE_MODEL}...")
+    model = load_disease_model(DISEASE_MODEL)
+    min_exceedances = model.get('min_exceedances')
+    if min_exceedances is not None:
+        aw_fb_cleaned = add_rolling_heart_features(aw_fb_cleaned, window=ROLLING_WINDOW)
+    scored_df = apply_disease_model(model, aw_fb_cleaned, min_exceedances=min_exceedances)
+    scored_df.to_csv(output_path, index=False)
+
+    # Fold the batch into the running approximate aggregates
+    result_sketch = load_sketches([RESULT_SKETCH]) if os.path.exists(RESULT_SKETCH) else ResultSketch()
+    result_sketch.update(scored_df)
+    save_sketch(result_sketch, RESULT_SKETCH)
+
+
+def sketch_report(paths, plots=True):
+    """
+    Prints the disease tables approximated from one or more result sketches (merged, e.g. one per
+    shard) and plots them with the BMI and heart rate distributions, without the result rows.
+
+    Args:
+        paths: ResultSketch JSON files.
+        plots: If False, only the tables are printed.
+    """
+    result_sketch = load_sketches(paths)
+    print(f"Approximate aggregates over {result_sketch.rows} rows:")
+    for table in result_sketch.disease_tables():
+        print(table.to_string(), end="\n\n")
+    if plots:
+        plot_sketch_results(result_sketch, save_dir=RESULTS_DIR)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Predicting chronic diseases from personal wearable devices.")
+    parser.add_argument('command', nargs='?', default='all', choices=['all', 'refresh-data', 'score', 'serve', 'stream', 'tune', 'budget-report', 'sketch-report'],
+                        help="'all' runs the full pipeline (default); 'refresh-data' only loads and stores the raw data; "
+                             "'score' assigns diseases to --input with the saved model; 'serve' starts the scoring service; "
+                             "'stream' follows --input (an append-only aw_fb CSV) and prints alerts; "
+                             "'tune' tunes the classifiers and saves their parameters; "
+                             "'budget-report' compares --max-rows/--time-budget fits with full fits; "
+                             "'sketch-report' reports and plots approximate aggregates from --sketches.")
+    parser.add_argument('--no-plots', action='store_true', help="Skip EDA and result plots.")
+    parser.add_argument('--workers', type=int, default=None, help="Fit the Sex/Age Bin classifiers in this many processes.")
+    parser.add_argument('--partitioned', action='store_true', help="Process the surveillance data in partitions (see partition.py).")
+    parser.add_argument('--partitions', nargs='+', default=None, help="With --partitioned, only use these partitions (e.g. LocationDesc values).")
+    parser.add_argument('--tuned', action='store_true', help="Use the classifier parameters saved by 'tune'.")
+    parser.add_argument('--tolerance', type=float, default=0.0, help="Accuracy to give up for cheaper models (tune).")
+    parser.add_argument('--max-rows', type=int, default=None, help="Fit the chronic and obesity classifiers on at most this many rows.")
+    parser.add_argument('--time-budget', type=float, default=None, help="Fit the chronic and obesity classifiers in about this many seconds each.")
+    parser.add_argument('--sketches', nargs='+', default=[RESULT_SKETCH], help="Result sketches to merge and report (sketch-report).")
+    parser.add_argument('--input', default=AWFB_DATA, help="Raw aw_fb CSV to score (score) or follow (stream).")
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, 'scored_results.csv'), help="Where to write scored rows (score).")
+    parser.add_argument('--host', default=SERVE_HOST, help="Host to bind (serve).")
+    parser.add_argument('--port', type=int, default=SERVE_PORT, help="Port to bind (serve).")
+    parser.add_argument('--unix-socket', default=None, help="Listen on a Unix socket instead of TCP (serve).")
+    args = parser.parse_args()
+
+    # Copy-on-write: assign(), column selections and the artifact writer's shallow snapshots share data until modified
+    pd.set_option('mode.copy_on_write', True)
+
+    # Creating Directories
+    os.makedirs(DATA_DIR, exist_ok=True)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+
+    if args.tuned:
+        load_forest_params(TUNED_PARAMS)
+
+    if args.command == 'refresh-data':
+        refresh_data()
+        print("\n--- Data refresh complete. Check the `data` directory. ---")
+    elif args.command == 'score':
+        score_only(args.input, args.output)
+        print(f"\n--- Scoring complete. Check {args.output}. ---")
+    elif args.command == 'serve':
+        import asyncio
+        from serve import serve
+        asyncio.run(serve(DISEASE_MODEL, host=args.host, port=args.port, unix_path=args.unix_socket))
+    elif args.command == 'sketch-report':
+        sketch_report(args.sketches, plots=not args.no_plots)
+    elif args.command == 'budget-report':
+        report_budget(max_rows=args.max_rows, time_budget=args.time_budget)
+    elif args.command == 'tune':
+        tune_classifiers(tolerance=args.tolerance)
+    elif args.command == 'stream':
+        from stream import StreamingDetector, follow_file
+        print(f"--- Following {args.input} ---")
+        try:
+            # Same window as the batch rolling features; without MIN_EXCEEDANCES each flagged reading alerts
+            StreamingDetector(window=ROLLING_WINDOW, min_exceedances=MIN_EXCEEDANCES or 1).run(follow_file(args.input, from_start=False))
+        except KeyboardInterrupt:
+            pass
+    else:
+        run_pipeline(plots=not args.no_plots, workers=args.workers, partitioned=args.partitioned, partition_values=args.partitions,
+                     max_rows=args.max_rows, time_budget=args.time_budget)
+        print("\n--- Data collection and plotting complete. Check the `data` and 'results' directory. ---")
@@ -0,0 +1,239 @@
+import os
+import re
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from augment import forest_params
+
+
+MANIFEST = '_manifest.json'
+
+
+def _shard_hash(shard) -> str:
+    """Content hash of a shard: its row values in order (not the index)."""
+    return hashlib.md5(pd.util.hash_pandas_object(shard, index=False).to_numpy().tobytes()).hexdigest()[:16]
+
+
+def _shard_file(value) -> str:
+    """A filesystem-safe, collision-free file name for a partition value."""
+    safe = re.sub(r'[^A-Za-z0-9_.-]+', '_', str(value))[:60]
+    return f"{safe}-{hashlib.md5(str(value).encode()).hexdigest()[:8]}.pkl"
+
+
+def read_manifest(part_dir) -> dict:
+    """
+    Args:
+        part_dir: A directory written by write_partitions.
+
+    Returns:
+        dict: {'by': column, 'partitions': {value: {'file', 'rows', 'hash'}}}, or an empty manifest.
+    """
+    path = os.path.join(part_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {'by': None, 'partitions': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+# --- 1. WRITE AND READ PARTITIONS
+def write_partitions(df, part_dir, by='LocationDesc') -> list:
+    """
+    Shards a surveillance DataFrame (nutri_df or chronic_df) into one pickle file per value of `by`.
+    Shards whose content is unchanged since the last write are left untouched.
+
+    Args:
+        df: The DataFrame created after running get_csv or get_chronic_data from load.py.
+        part_dir: The directory to write partitions and their manifest to.
+        by: The column to partition on, e.g. 'LocationDesc' or 'YearStart'.
+
+    Returns:
+        list: The partition values that were added or changed.
+    """
+    try:
+        print(f"Partitioning data by {by} into {part_dir}...")
+        os.makedirs(part_dir, exist_ok=True)
+        manifest = read_manifest(part_dir)
+        if manifest['by'] != by:
+            manifest = {'by': by, 'partitions': {}}
+
+        old_partitions = manifest['partitions']
+        partitions, changed = {}, []
+        # dropna=False keeps rows with a missing `by` value, in a partition of their own ('nan')
+        for value, shard in df.groupby(by, sort=True, dropna=False):
+            key = str(value)
+            entry = {'file': _shard_file(value), 'rows': len(shard), 'hash': _shard_hash(shard)}
+            if old_partitions.get(key, {}).get('hash') != entry['hash']:
+                shard.to_pickle(os.path.join(part_dir, entry['file']))
+                changed.append(key)
+            partitions[key] = entry
+
+        for key in set(old_partitions) - set(partitions):
+            path = os.path.join(part_dir, old_partitions[key]['file'])
+            if os.path.exists(path):
+                os.remove(path)
+
+        manifest['partitions'] = partitions
+        with open(os.path.join(part_dir, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        print(f"{len(partitions)} partitions written ({len(changed)} added or changed).")
+        return changed
+
+    except Exception as e:
+        print(f"Could not partition data: {e}")
+
+
+def read_partitions(part_dir, values=None) -> pd.DataFrame:
+    """
+    Reads only the requested partitions.
+
+    Args:
+        part_dir: A directory written by write_partitions.
+        values: Partition values to read (default all).
+
+    Returns:
+        pd.DataFrame: The concatenated partitions.
+    """
+    partitions = read_manifest(part_dir)['partitions']
+    keys = sorted(partitions) if values is None else [str(value) for value in values]
+    missing = [key for key in keys if key not in partitions]
+    if missing:
+        raise KeyError(f"No partitions for {missing} in {part_dir}")
+    return pd.concat([pd.read_pickle(os.path.join(part_dir, partitions[key]['file'])) for key in keys])
+
+
+# --- 2. PROCESS AND IMPUTE PARTITIONS IN PARALLEL
+def _process_shard(task) -> str:
+    """
+    Worker: runs process_* and predict_sex_age_* on one partition and pickles the combined result.
+    The classifier parameters come with the task, since a spawned worker re-imports augment without
+    the parameters loaded by `main.py --tuned`.
+
+    Returns:
+        str: The partition value, or None if the shard could not be processed.
+    """
+    import augment
+    from process import process_nutri_data, process_chronic_data
+    from augment import predict_sex_age_nutri, predict_sex_age_chronic
+
+    kind, key, shard_path, out_path, params, budget = task
+    augment.FOREST_PARAMS.update(params)
+    shard = pd.read_pickle(shard_path)
+
+    if kind == 'nutri':
+        split = process_nutri_data(shard)
+        combined = predict_sex_age_nutri(*split) if split is not None else None
+    else:
+        split = process_chronic_data(shard)
+        combined = predict_sex_age_chronic(split[2], split[0], split[1], **budget) if split is not None else None
+
+    if combined is None:
+        return None
+    combined.to_pickle(out_path)
+    return key
+
+
+def _impute_pooled(part_dir, kind, keys, failed, budget) -> pd.DataFrame:
+    """
+    Imputes the partitions in `failed` with classifiers trained on all the partitions in `keys`
+    (as in the default, unpartitioned run), for partitions that cannot be fitted on their own.
+
+    Returns:
+        pd.DataFrame: The combined DataFrame (as from predict_sex_age_*) of the failed partitions, or None.
+    """
+    from process import process_nutri_data, process_chronic_data
+    from augment import predict_sex_age_nutri, predict_sex_age_chronic
+
+    if kind == 'nutri':
+        pooled = process_nutri_data(read_partitions(part_dir, keys))
+        target = process_nutri_data(read_partitions(part_dir, failed))
+        if pooled is None or target is None:
+            return None
+        return predict_sex_age_nutri(pooled[0], pooled[1], target[2])
+
+    pooled = process_chronic_data(read_partitions(part_dir, keys))
+    target = process_chronic_data(read_partitions(part_dir, failed))
+    if pooled is None or target is None:
+        return None
+    return predict_sex_age_chronic(pooled[2], pooled[0], target[1], **budget)
+
+
+def process_partitioned(part_dir, kind, values=None, changed=None, max_workers=None, max_rows=None, time_budget=None) -> pd.DataFrame:
+    """
+    Processes and imputes Sex/Age Bin for each partition in parallel worker processes.
+    Results are cached per partition next to the shards and reused while the shard's content hash
+    and the classifier parameters (e.g. from `main.py --tuned`) are unchanged, so a refresh only
+    recomputes the partitions that changed.
+
+    Each partition is imputed with classifiers trained on that partition alone. With LocationDesc
+    partitions this gives one model per location (LocationDesc is already a model feature), so the
+    imputations differ from the default run's single model. Partitions that cannot be fitted alone
+    (e.g. a location without Sex or Age rows) are imputed with classifiers trained on all requested
+    partitions; if that also fails, None is returned rather than results missing those partitions.
+
+    Args:
+        part_dir: A directory written by write_partitions.
+        kind: 'nutri' (process_nutri_data + predict_sex_age_nutri) or
+              'chronic' (process_chronic_data + predict_sex_age_chronic).
+        values: Partition values to process (default all).
+        changed: Partition values touched since the last run (e.g. changes.touched for the refresh's
+                 ChangeSet). These are always recomputed; the others reuse their cached results.
+                 Default: recompute only the partitions without a cached result for their shard hash.
+        max_workers: Worker processes (default: CPU count).
+        max_rows, time_budget: Passed to predict_sex_age_chronic for each partition (chronic only).
+
+    Returns:
+        pd.DataFrame: The combined DataFrame (as from predict_sex_age_*) for the requested partitions.
+    """
+    try:
+        if kind not in ('nutri', 'chronic'):
+            raise ValueError(f"kind must be 'nutri' or 'chronic', not {kind!r}")
+
+        manifest = read_manifest(part_dir)
+        partitions = manifest['partitions']
+        keys = sorted(partitions) if values is None else [str(value) for value in values]
+        print(f"Fitting one model per {manifest['by']} partition; imputations differ from the "
+              f"default run, which fits one model on all rows.")
+        out_dir = os.path.join(part_dir, f"_{kind}_combined")
+        os.makedirs(out_dir, exist_ok=True)
+
+        # Sent to the workers and part of each cached result's name, so new parameters are never served stale results
+        params = {name: forest_params(name) for name in (f'{kind}_sex', f'{kind}_age')}
+        budget = {'max_rows': max_rows, 'time_budget': time_budget} if kind == 'chronic' else {}
+        params_hash = hashlib.md5(json.dumps([params, budget], sort_keys=True).encode()).hexdigest()[:8]
+
+        def out_path(key):
+            return os.path.join(out_dir, f"{partitions[key]['hash']}-{params_hash}-{partitions[key]['file']}")
+
+        touched = set() if changed is None else {str(value) for value in changed}
+        stale = [key for key in keys if key in touched or not os.path.exists(out_path(key))]
+        for key in stale:
+            # Drop results cached for older versions of the shard
+            for name in os.listdir(out_dir):
+                if name.endswith(f"-{partitions[key]['file']}"):
+                    os.remove(os.path.join(out_dir, name))
+        print(f"Processing {len(stale)} of {len(keys)} {kind} partitions ({len(touched.intersection(keys))} changed, "
+              f"{len(keys) - len(stale)} cached)...")
+
+        tasks = [(kind, key, os.path.join(part_dir, partitions[key]['file']), out_path(key), params, budget) for key in stale]
+        failed = []
+        if tasks:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                done = set(pool.map(_process_shard, tasks))
+            failed = [key for key in stale if key not in done]
+
+        frames = [pd.read_pickle(out_path(key)) for key in keys if key not in failed]
+        if failed:
+            print(f"Partitions {failed} could not be imputed on their own; "
+                  f"imputing them with models trained on all {len(keys)} requested partitions...")
+            pooled = _impute_pooled(part_dir, kind, keys, failed, budget)
+            if pooled is None:
+                raise RuntimeError(f"partitions {failed} could not be imputed")
+            frames.append(pooled)
+
+        print(f"{kind} partitions successfully processed!")
+        return pd.concat(frames, ignore_index=True)
+
+    except Exception as e:
+        print(f"Could not process {kind} partitions: {e}")
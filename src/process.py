@@ -1,49 +1,144 @@
+import numpy as np
 import pandas as pd
 
 
+# Age_Bin labels of process_aw_fb_data (an object array, so rows share these four strings)
+AGE_BINS = np.array(['18-44', '45-64', '65+', 'other'], dtype=object)
+
+
 # --- 1. CLEANS Apple Watch and Fitbit DATA
-def process_aw_fb_data(aw_fb_df) -> pd.DataFrame:
+def process_aw_fb_data(aw_fb_df, verbose=True) -> pd.DataFrame:
     """
     Preprocesses data collected from aw_fb_data.csv.
 
     Args:
         aw_fb_df: The DataFrame created after running get_csv from load.py.
+        verbose: If False, progress messages are not printed (errors still are).
 
     Returns:
         pd.DataFrame: A DataFrame with cleaned and engineered features.
     """
 
     try: 
-        # Creating dataframe of equal length
-        print(f"Cleaning aw_fb_data...")
-        aw_fb_cleaned = pd.DataFrame(index=aw_fb_df.index)
-
-        # Adding engineered / cleaned features
-        aw_fb_cleaned['Device'] = aw_fb_df['device'].map({'apple watch': 'Apple Watch', 'fitbit': 'Fitbit'})
-        aw_fb_cleaned['Activity'] = aw_fb_df['activity']
-        aw_fb_cleaned['Sex'] = aw_fb_df['gender'].map({0: 'Female', 1: 'Male'})
-        aw_fb_cleaned['Age'] = aw_fb_df['age']
-        aw_fb_cleaned['Age_Bin'] = aw_fb_df['age'].apply(lambda x: '18-44' if 18 <= x <= 44 else ('45-64' if 45 <= x <= 64 else ('65+' if x >= 65 else 'other')))
-        aw_fb_cleaned['Height_cm'] = aw_fb_df['height']
-        aw_fb_cleaned['Weight_kg'] = aw_fb_df['weight']
-        aw_fb_cleaned['BMI'] = aw_fb_df['weight'] / ((aw_fb_df['height'] / 100) ** 2)
-        aw_fb_cleaned['heart_rate'] = aw_fb_df['hear_rate']
-        aw_fb_cleaned['sd_norm_heart'] = aw_fb_df['sd_norm_heart']
-        aw_fb_cleaned['resting_heart'] = aw_fb_df['resting_heart']
-        aw_fb_cleaned['intensity_karvonen'] = aw_fb_df['intensity_karvonen']
-        aw_fb_cleaned['target_heart_rate'] = aw_fb_cleaned['resting_heart'] + (aw_fb_cleaned['heart_rate'] - aw_fb_cleaned['resting_heart']) * aw_fb_cleaned['intensity_karvonen']
-        aw_fb_cleaned['Disease'] = aw_fb_cleaned.apply(lambda row: 1 if (row['heart_rate'] > row['target_heart_rate'] + 2 * row['sd_norm_heart']) and 
-                                                                        (row['heart_rate'] > row['target_heart_rate'] - 2 * row['sd_norm_heart'])
-                                                                        else 0, axis=1)
-        aw_fb_cleaned['Possible Obesity'] = aw_fb_cleaned.apply(lambda row: 1 if (18.5 <= row['BMI'] > 18.5 <= 24.9)
-                                                                        else 0, axis=1)                                       
-        print("Data successfully cleaned.")
+        if verbose:
+            print(f"Cleaning aw_fb_data...")
+        age = aw_fb_df['age']
+        bmi = aw_fb_df['weight'] / ((aw_fb_df['height'] / 100) ** 2)
+        heart_rate = aw_fb_df['hear_rate']
+        sd_norm_heart = aw_fb_df['sd_norm_heart']
+        resting_heart = aw_fb_df['resting_heart']
+        intensity_karvonen = aw_fb_df['intensity_karvonen']
+        target_heart_rate = resting_heart + (heart_rate - resting_heart) * intensity_karvonen
+
+        # Adding engineered / cleaned features (vectorized, built as one DataFrame)
+        aw_fb_cleaned = pd.DataFrame({
+            'Device': aw_fb_df['device'].map({'apple watch': 'Apple Watch', 'fitbit': 'Fitbit'}),
+            'Activity': aw_fb_df['activity'],
+            'Sex': aw_fb_df['gender'].map({0: 'Female', 1: 'Male'}),
+            'Age': age,
+            'Age_Bin': AGE_BINS[np.select([(age >= 18) & (age <= 44), (age >= 45) & (age <= 64), age >= 65], [0, 1, 2], default=3)],
+            'Height_cm': aw_fb_df['height'],
+            'Weight_kg': aw_fb_df['weight'],
+            'BMI': bmi,
+            'heart_rate': heart_rate,
+            'sd_norm_heart': sd_norm_heart,
+            'resting_heart': resting_heart,
+            'intensity_karvonen': intensity_karvonen,
+            'target_heart_rate': target_heart_rate,
+            'Disease': ((heart_rate > target_heart_rate + 2 * sd_norm_heart) &
+                        (heart_rate > target_heart_rate - 2 * sd_norm_heart)).astype(int),
+            # Same rule as the per-row check 18.5 <= BMI > 18.5 <= 24.9
+            'Possible Obesity': ((bmi >= 18.5) & (bmi > 18.5)).astype(int),
+        }, index=aw_fb_df.index)
+        if verbose:
+            print("Data successfully cleaned.")
         return aw_fb_cleaned
     
     except Exception as e:
         print(f"Could not clean aw_fb_data: {e}")
 
 
+# --- 1b. ROLLING HEART RATE FEATURES FOR Apple Watch and Fitbit DATA
+def add_rolling_heart_features(aw_fb_cleaned, window=10) -> pd.DataFrame:
+    """
+    Adds rolling heart rate features over each participant's repeated readings of an activity.
+    A participant is identified by Age, Height_cm, Weight_kg, Sex and Device. Readings keep their
+    original order within each participant and activity; the first readings use a partial window.
+
+    Computed with cumulative sums and shifted array maxima over the grouped rows (no Python loop
+    over rows or groups), so it scales to millions of readings. Missing heart rates are skipped
+    within their window, as in pandas' rolling(window, min_periods=1).
+
+    Args:
+        aw_fb_cleaned: The DataFrame created after running process_aw_fb_data.
+        window: Number of readings in each rolling window.
+
+    Returns:
+        pd.DataFrame: A new DataFrame of aw_fb_cleaned (which is not modified) with added columns:
+            - heart_rate_roll_mean: Rolling mean of heart_rate.
+            - heart_rate_roll_var: Rolling sample variance of heart_rate (NaN for a single reading).
+            - heart_rate_roll_max: Rolling max of heart_rate.
+            - exceed_roll_count: Number of readings in the window with Disease == 1.
+    """
+
+    try:
+        print(f"Adding rolling heart rate features (window={window})...")
+        group_cols = ['Age', 'Height_cm', 'Weight_kg', 'Sex', 'Device', 'Activity']
+        n = len(aw_fb_cleaned)
+
+        # Stable sort by group so each participant/activity is one contiguous run in original order
+        codes = aw_fb_cleaned.groupby(group_cols, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+        order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+
+        rows = np.arange(n)
+        is_start = np.ones(n, dtype=bool)
+        is_start[1:] = sorted_codes[1:] != sorted_codes[:-1]
+        position = rows - np.maximum.accumulate(np.where(is_start, rows, 0))
+        count = np.minimum(position + 1, window)
+
+        def rolling_sum(values):
+            cumulative = np.concatenate(([0.0], np.cumsum(values)))
+            return cumulative[rows + 1] - cumulative[rows + 1 - count]
+
+        heart_rate = aw_fb_cleaned['heart_rate'].to_numpy(dtype=float)[order]
+        exceed = (aw_fb_cleaned['Disease'].to_numpy() == 1)[order].astype(float)
+
+        # Missing heart rates add nothing to the sums, and each window is averaged over its valid readings
+        valid = rolling_sum(~np.isnan(heart_rate)).round()
+        # Centering keeps the cumulative sums small, so the variance does not lose precision
+        offset = np.nanmean(heart_rate) if valid.any() else 0.0
+        centered = np.nan_to_num(heart_rate - offset)
+        sums = rolling_sum(centered)
+        mean = np.divide(sums, valid, out=np.full(n, np.nan), where=valid > 0)
+        var = np.divide(rolling_sum(centered ** 2) - sums * mean, valid - 1, out=np.full(n, np.nan), where=valid > 1)
+        var = np.maximum(var, 0.0)
+
+        # fmax ignores NaN, so a window's max is NaN only if all of its readings are missing
+        roll_max = heart_rate.copy()
+        for lag in range(1, min(window, n)):
+            lagged = np.full(n, np.nan)
+            lagged[lag:] = heart_rate[:-lag]
+            roll_max = np.fmax(roll_max, np.where(position >= lag, lagged, np.nan))
+
+        features = {
+            'heart_rate_roll_mean': mean + offset,
+            'heart_rate_roll_var': var,
+            'heart_rate_roll_max': roll_max,
+            'exceed_roll_count': rolling_sum(exceed).round().astype(int),
+        }
+        for col, values in features.items():
+            unsorted = np.empty_like(values)
+            unsorted[order] = values
+            features[col] = unsorted
+
+        print("Rolling heart rate features added.")
+        return aw_fb_cleaned.assign(**features)
+
+    except Exception as e:
+        print(f"Could not add rolling heart rate features: {e}")
+
+
 # --- 2. CLEANS Nutrition Physical Activity and Obesity - Behavioral Risk Factor Surveillance System DATA
 def process_nutri_data(nutri_df) -> tuple:
     """
@@ -0,0 +1,154 @@
+import time
+import numpy as np
+import pandas as pd
+
+
+# Rows fitted to estimate the per-row fit cost when a time budget is given
+PILOT_ROWS = 5000
+# Share of the time budget planned for, leaving room for the super-linear cost of larger fits
+BUDGET_SAFETY = 0.8
+
+
+# --- 1. STRATIFIED SAMPLING
+def stratified_sample(strata_df, max_rows, random_state=42) -> np.ndarray:
+    """
+    Draws a sample of at most max_rows rows preserving the joint proportions of the strata columns
+    (e.g. the label and LocationDesc). Each stratum gets its proportional share of rows, with
+    leftover rows going to the strata with the largest remainders.
+
+    Args:
+        strata_df: A DataFrame with only the columns to stratify on.
+        max_rows: The number of rows to draw.
+        random_state: Seed for the rows drawn within each stratum.
+
+    Returns:
+        np.ndarray: Sorted positional indices of the sampled rows.
+    """
+    n = len(strata_df)
+    if max_rows >= n:
+        return np.arange(n)
+
+    codes = strata_df.groupby(list(strata_df.columns), sort=False, dropna=False).ngroup().to_numpy()
+    sizes = np.bincount(codes)
+    quota = sizes * (max_rows / n)
+    allocation = np.floor(quota).astype(int)
+    leftover = max_rows - allocation.sum()
+    allocation[np.argsort(allocation - quota, kind='stable')[:leftover]] += 1
+
+    # Rank rows within their stratum in random order and keep each stratum's first `allocation` rows
+    order = np.random.default_rng(random_state).permutation(n)
+    rank = pd.Series(codes[order]).groupby(codes[order]).cumcount().to_numpy()
+    keep = order[rank < allocation[codes[order]]]
+    return np.sort(keep)
+
+
+def rows_for_time_budget(make_clf, X, y, strata_df, time_budget, pilot_rows=PILOT_ROWS) -> int:
+    """
+    Estimates how many rows can be fitted within time_budget seconds by timing a fit on a small
+    stratified pilot sample and extrapolating linearly (scaled by BUDGET_SAFETY).
+
+    Args:
+        make_clf: Returns a new, unfitted classifier.
+        X, y: The full training data.
+        strata_df: The columns to stratify the pilot sample on.
+        time_budget: Seconds available for the fit.
+        pilot_rows: Rows in the pilot fit.
+
+    Returns:
+        int: The row budget.
+    """
+    pilot = stratified_sample(strata_df, pilot_rows)
+    start = time.perf_counter()
+    make_clf().fit(X.iloc[pilot], y[pilot])
+    seconds_per_row = (time.perf_counter() - start) / len(pilot)
+    return max(len(pilot), int(time_budget * BUDGET_SAFETY / seconds_per_row))
+
+
+def budget_rows(make_clf, X, y, strata_df, max_rows=None, time_budget=None) -> np.ndarray:
+    """
+    The rows to fit on: all rows, or a stratified sample within the row or time budget.
+
+    Args:
+        make_clf, X, y, strata_df, max_rows, time_budget: As for fit_within_budget.
+
+    Returns:
+        np.ndarray: Sorted positional indices of the rows to fit on.
+    """
+    budget = len(X) if max_rows is None else max_rows
+    if time_budget is not None:
+        budget = min(budget, rows_for_time_budget(make_clf, X, np.asarray(y), strata_df, time_budget))
+    return stratified_sample(strata_df, budget)
+
+
+def fit_within_budget(make_clf, X, y, strata_df, max_rows=None, time_budget=None):
+    """
+    Fits a classifier on all rows, or on a stratified sample when a row or time budget is given.
+
+    Args:
+        make_clf: Returns a new, unfitted classifier.
+        X: The encoded training features (DataFrame).
+        y: The training labels (array).
+        strata_df: The columns to stratify the sample on (e.g. the label and LocationDesc).
+        max_rows: Fit on at most this many rows.
+        time_budget: Fit within roughly this many seconds.
+
+    Returns:
+        tuple: (fitted classifier, number of rows it was fitted on)
+    """
+    y = np.asarray(y)
+    rows = budget_rows(make_clf, X, y, strata_df, max_rows=max_rows, time_budget=time_budget)
+
+    clf = make_clf()
+    if len(rows) >= len(X):
+        return clf.fit(X, y), len(X)
+
+    print(f"Fitting on a stratified sample of {len(rows)} of {len(X)} rows...")
+    return clf.fit(X.iloc[rows], y[rows]), len(rows)
+
+
+# --- 2. COST OF A BUDGET
+def budget_report(make_clf, X, y, strata_df, X_apply, max_rows=None, time_budget=None, test_size=0.2) -> dict:
+    """
+    Compares a budgeted fit with a full fit: both are trained on the same stratified split, scored
+    on the held-out rows, and used to predict X_apply (the rows the pipeline assigns labels to).
+
+    Args:
+        make_clf: Returns a new, unfitted classifier.
+        X, y, strata_df: As for fit_within_budget.
+        X_apply: The encoded rows the classifier is applied to.
+        max_rows, time_budget: The budget to evaluate.
+        test_size: Share of rows held out for scoring.
+
+    Returns:
+        dict: Training rows and fit seconds of both fits, their held-out accuracy, the accuracy lost, and
+              the share of X_apply predictions on which both fits agree.
+    """
+    y = np.asarray(y)
+    holdout = np.zeros(len(X), dtype=bool)
+    holdout[stratified_sample(strata_df, int(len(X) * test_size), random_state=0)] = True
+    train = ~holdout
+
+    X_train, y_train, strata_train = X[train], y[train], strata_df[train]
+
+    start = time.perf_counter()
+    full = make_clf().fit(X_train, y_train)
+    full_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    budgeted, budget_rows = fit_within_budget(make_clf, X_train, y_train, strata_train, max_rows=max_rows, time_budget=time_budget)
+    budget_seconds = time.perf_counter() - start
+
+    full_accuracy = float((full.predict(X[holdout]) == y[holdout]).mean())
+    budget_accuracy = float((budgeted.predict(X[holdout]) == y[holdout]).mean())
+    agreement = float((full.predict(X_apply) == budgeted.predict(X_apply)).mean()) if len(X_apply) else 1.0
+
+    return {
+        'full_rows': int(train.sum()),
+        'budget_rows': budget_rows,
+        'full_fit_seconds': full_seconds,
+        'budget_fit_seconds': budget_seconds,
+        'full_accuracy': full_accuracy,
+        'budget_accuracy': budget_accuracy,
+        'accuracy_lost': full_accuracy - budget_accuracy,
+        'apply_agreement': agreement,
+    }
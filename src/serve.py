@@ -0,0 +1,284 @@
+import json
+import time
+import asyncio
+import contextlib
+from collections import deque
+import numpy as np
+import pandas as pd
+from config import DISEASE_MODEL, SERVE_HOST, SERVE_PORT
+from process import process_aw_fb_data
+from augment import load_disease_model, apply_disease_model
+
+
+# Raw aw_fb_data.csv columns read by process_aw_fb_data
+REQUIRED_COLUMNS = ['device', 'activity', 'gender', 'age', 'height', 'weight', 'hear_rate',
+                    'sd_norm_heart', 'resting_heart', 'intensity_karvonen']
+NUMERIC_COLUMNS = ['gender', 'age', 'height', 'weight', 'hear_rate', 'sd_norm_heart', 'resting_heart', 'intensity_karvonen']
+
+
+# --- 1. MICRO-BATCHING SCORER
+class ScoringService:
+    """
+    Scores raw aw_fb rows (same schema as aw_fb_data.csv) with a fitted disease model.
+
+    Concurrent requests are queued and scored together: a batch is closed once it holds
+    max_batch_rows rows or max_wait_ms has passed since its first request arrived.
+    Each request's rows are validated before they join a batch, and if a batch still fails, its
+    requests are scored one by one so only the failing request gets the error.
+
+    Rows are scored one reading at a time, so models saved with a min_exceedances rule (which needs
+    each participant's recent readings) are rejected; score those with `main.py score` or `stream`.
+    """
+
+    def __init__(self, model, max_batch_rows=2048, max_wait_ms=5, latency_window=10000):
+        """
+        Args:
+            model: The dict returned by fit_disease_model or load_disease_model.
+            max_batch_rows: Upper bound on the rows scored together.
+            max_wait_ms: How long the first request of a batch waits for others to join.
+            latency_window: Number of most recent request latencies kept for percentiles.
+
+        Raises:
+            ValueError: If the model was saved with a min_exceedances rule.
+        """
+        if model.get('min_exceedances') is not None:
+            raise ValueError(f"the model assigns diseases when {model['min_exceedances']} readings in a rolling window "
+                             "are flagged, but the service scores single readings; use `main.py score` instead")
+        self.model = model
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self.latencies = deque(maxlen=latency_window)
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        """Starts the background batching task on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._batcher())
+
+    async def stop(self):
+        """Cancels the background batching task."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+    def score_frame(self, raw_df) -> pd.DataFrame:
+        """
+        Runs the process_aw_fb_data feature logic and the disease model over raw rows.
+
+        Args:
+            raw_df: A DataFrame with the aw_fb_data.csv schema.
+
+        Returns:
+            pd.DataFrame: The cleaned rows with Possible_Disease and Assigned_Disease.
+        """
+        # Progress messages are turned off to keep the service log clean
+        cleaned = process_aw_fb_data(raw_df, verbose=False)
+        if cleaned is None:
+            raise ValueError("rows could not be cleaned; check they follow the aw_fb_data.csv schema")
+        return apply_disease_model(self.model, cleaned, verbose=False)
+
+    async def score(self, rows) -> list:
+        """
+        Queues rows for scoring and waits for their batch to finish.
+
+        Args:
+            rows: A list of dicts with the aw_fb_data.csv schema.
+
+        Returns:
+            list: One dict per row with Possible_Disease and Assigned_Disease.
+
+        Raises:
+            ValueError: If rows is not a list of objects, or a row is missing one of REQUIRED_COLUMNS or has a
+                        non-numeric value in NUMERIC_COLUMNS.
+        """
+        if not isinstance(rows, list):
+            raise ValueError("'rows' must be a list of objects")
+        for i, row in enumerate(rows):
+            if not isinstance(row, dict):
+                raise ValueError(f"row {i} is not an object")
+            missing = [col for col in REQUIRED_COLUMNS if col not in row]
+            if missing:
+                raise ValueError(f"row {i} is missing columns: {missing}")
+
+        raw_df = pd.DataFrame(rows, columns=REQUIRED_COLUMNS)
+        for col in NUMERIC_COLUMNS:
+            try:
+                raw_df[col] = pd.to_numeric(raw_df[col], errors='raise')
+            except (ValueError, TypeError) as e:
+                raise ValueError(f"column '{col}' must be numeric: {e}")
+
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((raw_df, future))
+        result = await future
+        self.latencies.append(time.perf_counter() - start)
+        self.requests += 1
+        return result
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            n_rows = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while n_rows < self.max_batch_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                n_rows += len(item[0])
+
+            raw_df = pd.concat([frame for frame, _ in batch], ignore_index=True)
+            try:
+                # The model runs in a worker thread so requests keep queueing for the next batch.
+                scored = await loop.run_in_executor(None, self.score_frame, raw_df)
+            except Exception:
+                # Rescore the requests one by one so only the failing one gets the error
+                for frame, future in batch:
+                    try:
+                        scored = await loop.run_in_executor(None, self.score_frame, frame)
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                    else:
+                        self._resolve([(frame, future)], scored)
+                continue
+
+            self._resolve(batch, scored)
+
+    def _resolve(self, batch, scored):
+        """Splits the scored rows of a batch back into its requests' results."""
+        out = scored[['Possible_Disease', 'Assigned_Disease']].astype(object)
+        records = out.where(out.notna(), None).to_dict(orient='records')
+        self.batches += 1
+        self.rows += len(records)
+
+        offset = 0
+        for frame, future in batch:
+            if not future.done():
+                future.set_result(records[offset:offset + len(frame)])
+            offset += len(frame)
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: Request/row/batch counters and latency percentiles (ms) over the recent window.
+        """
+        stats = {
+            'requests': self.requests,
+            'rows': self.rows,
+            'batches': self.batches,
+            'mean_batch_rows': self.rows / self.batches if self.batches else 0.0,
+        }
+        if self.latencies:
+            p50, p95, p99 = np.percentile(np.fromiter(self.latencies, dtype=float), [50, 95, 99]) * 1000
+            stats.update({'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99, 'max_ms': max(self.latencies) * 1000})
+        return stats
+
+
+# --- 2. HTTP FRONT END
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+
+
+async def _send(writer, status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (
+        f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode() + body)
+    await writer.drain()
+
+
+async def _handle(service, reader, writer):
+    """
+    Serves keep-alive HTTP/1.1 connections:
+        - POST /score with {"rows": [...]} returns {"assignments": [...]}
+        - GET /stats returns ScoringService.stats()
+        - GET /health returns {"status": "ok"}
+    """
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            keep_alive = headers.get('connection', '').lower() != 'close'
+
+            if method == 'POST' and path == '/score':
+                try:
+                    rows = json.loads(body)['rows']
+                except (ValueError, KeyError, TypeError) as e:
+                    await _send(writer, 400, {'error': f"expected a JSON body with 'rows': {e}"}, keep_alive)
+                else:
+                    try:
+                        assignments = await service.score(rows) if rows else []
+                        await _send(writer, 200, {'assignments': assignments}, keep_alive)
+                    except ValueError as e:
+                        await _send(writer, 400, {'error': str(e)}, keep_alive)
+                    except Exception as e:
+                        await _send(writer, 500, {'error': str(e)}, keep_alive)
+            elif method == 'GET' and path == '/stats':
+                await _send(writer, 200, service.stats(), keep_alive)
+            elif method == 'GET' and path == '/health':
+                await _send(writer, 200, {'status': 'ok'}, keep_alive)
+            else:
+                await _send(writer, 404, {'error': f"no route for {method} {path}"}, keep_alive)
+
+            if not keep_alive:
+                break
+
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(model_path=DISEASE_MODEL, host=SERVE_HOST, port=SERVE_PORT, unix_path=None, **service_kwargs):
+    """
+    Loads the fitted disease model once and serves it until cancelled.
+
+    Args:
+        model_path: The pickled model written by assign_disease(..., model_path=...).
+        host: The TCP host to bind (ignored if unix_path is given).
+        port: The TCP port to bind (ignored if unix_path is given).
+        unix_path: If given, listen on this Unix socket instead of TCP.
+        **service_kwargs: Passed to ScoringService (max_batch_rows, max_wait_ms, ...).
+    """
+    print(f"--- Loading disease model from {model_path} ---")
+    service = ScoringService(load_disease_model(model_path), **service_kwargs)
+    service.start()
+
+    handler = lambda reader, writer: _handle(service, reader, writer)
+    if unix_path is not None:
+        server = await asyncio.start_unix_server(handler, path=unix_path)
+        print(f"Scoring service listening on unix:{unix_path}")
+    else:
+        server = await asyncio.start_server(handler, host=host, port=port)
+        print(f"Scoring service listening on http://{host}:{port}")
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
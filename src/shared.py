@@ -0,0 +1,170 @@
+import os
+import shutil
+import resource
+import tempfile
+from typing import NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+
+class SharedMatrix(NamedTuple):
+    """
+    A small, cheaply picklable handle to a matrix stored as a .npy file.
+    Workers call attach() to memory-map it instead of receiving a pickled copy.
+    """
+    path: str
+    shape: tuple
+    dtype: str
+    columns: tuple = ()
+
+
+# --- 1. WRITE AND ATTACH MATRICES
+class FeatureMatrixStore:
+    """
+    Writes encoded feature matrices once as .npy files so any number of worker processes can
+    memory-map them. All workers share the same page-cache pages, so per-worker memory does not
+    grow with the matrix size or the number of workers.
+
+    Used as a context manager, a temporary directory is created and removed on exit.
+    """
+
+    def __init__(self, directory=None, chunk_rows=100_000):
+        """
+        Args:
+            directory: Where to write the .npy files. If None, a temporary directory is used.
+            chunk_rows: Rows converted per step when writing a DataFrame, bounding the temporary copy.
+        """
+        self._owns_directory = directory is None
+        self.directory = tempfile.mkdtemp(prefix='feature_matrices_') if directory is None else directory
+        self.chunk_rows = chunk_rows
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Removes the directory if it was created by this store."""
+        if self._owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def path(self, name) -> str:
+        return os.path.join(self.directory, f"{name}.npy")
+
+    def put(self, name, data, dtype=np.float32) -> SharedMatrix:
+        """
+        Writes a DataFrame or array to <directory>/<name>.npy.
+
+        float32 is the dtype scikit-learn's trees work in, so RandomForestClassifier.fit/predict use
+        the memory-mapped matrix as-is rather than converting it to a private copy.
+
+        Args:
+            name: The file name (without .npy).
+            data: A 2-D DataFrame (e.g. from pd.get_dummies) or a 1-D/2-D array.
+            dtype: The stored dtype.
+
+        Returns:
+            SharedMatrix: The handle to pass to workers.
+        """
+        columns = tuple(data.columns) if isinstance(data, pd.DataFrame) else ()
+        values = data if isinstance(data, pd.DataFrame) else np.asarray(data)
+
+        out = np.lib.format.open_memmap(self.path(name), mode='w+', dtype=dtype, shape=values.shape)
+        for start in range(0, len(values), self.chunk_rows):
+            chunk = values.iloc[start:start + self.chunk_rows] if isinstance(values, pd.DataFrame) else values[start:start + self.chunk_rows]
+            out[start:start + len(chunk)] = np.asarray(chunk, dtype=dtype)
+        out.flush()
+        del out
+
+        return SharedMatrix(self.path(name), tuple(values.shape), np.dtype(dtype).str, columns)
+
+    def get(self, name):
+        """
+        Returns the handle of a matrix already written under `name`, or None. Lets a persistent
+        directory act as a cache of encoded matrices across runs.
+        """
+        if not os.path.exists(self.path(name)):
+            return None
+        matrix = attach(self.path(name))
+        return SharedMatrix(self.path(name), matrix.shape, matrix.dtype.str)
+
+
+def attach(matrix) -> np.ndarray:
+    """
+    Memory-maps a SharedMatrix (read-only, no copy). Arrays are passed through unchanged.
+
+    Args:
+        matrix: A SharedMatrix, a .npy path or an array.
+
+    Returns:
+        np.ndarray: The matrix.
+    """
+    if isinstance(matrix, SharedMatrix):
+        return np.load(matrix.path, mmap_mode='r')
+    if isinstance(matrix, str):
+        return np.load(matrix, mmap_mode='r')
+    return matrix
+
+
+# --- 2. PARALLEL FITS
+def _anonymous_mb():
+    """Current anonymous (private heap) memory of this process in MB; memory-mapped files are excluded. Linux only."""
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Anonymous:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def fit_predict_task(task) -> dict:
+    """
+    Fits one RandomForestClassifier and predicts with it. Runs in a worker process.
+
+    Args:
+        task: A dict with:
+            - name: An identifier returned with the result.
+            - X_train, y_train, X_apply: SharedMatrix handles (or arrays).
+            - params: Keyword arguments for RandomForestClassifier.
+
+    Returns:
+        dict: name, predictions, the worker's peak resident memory in MB (which also counts the
+              mapped file pages shared with other workers) and its anonymous memory in MB after
+              the fit (private copies only).
+    """
+    from sklearn.ensemble import RandomForestClassifier
+
+    clf = RandomForestClassifier(**task['params'])
+    clf.fit(attach(task['X_train']), attach(task['y_train']))
+    predictions = clf.predict(attach(task['X_apply']))
+
+    return {
+        'name': task['name'],
+        'predictions': predictions,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'anonymous_mb': _anonymous_mb(),
+    }
+
+
+def run_parallel_fits(tasks, max_workers=None) -> dict:
+    """
+    Runs fit_predict_task for each task in a pool of worker processes.
+    Only the small SharedMatrix handles are pickled to the workers.
+
+    Args:
+        tasks: A list of task dicts (see fit_predict_task).
+        max_workers: Worker processes (default: one per task, capped at the CPU count).
+
+    Returns:
+        dict: name -> result dict from fit_predict_task.
+    """
+    if max_workers is None:
+        max_workers = max(1, min(len(tasks), os.cpu_count() or 1))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return {result['name']: result for result in pool.map(fit_predict_task, tasks)}
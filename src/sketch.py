@@ -0,0 +1,294 @@
+import json
+import math
+import numpy as np
+import pandas as pd
+from config import CMS_EPSILON, CMS_DELTA, QUANTILE_ACCURACY
+
+
+# --- 1. COUNT-MIN SKETCH
+class CountMinSketch:
+    """
+    Approximate counts of string keys in a fixed depth x width table of counters.
+
+    Error bound: with width = ceil(e / epsilon) and depth = ceil(ln(1 / delta)), an estimate is never
+    below the true count and exceeds it by more than epsilon * total with probability at most delta
+    (total = the sum of all counts added). Memory does not grow with the number of rows or keys.
+
+    Sketches with the same epsilon, delta and seed can be merged by adding their tables.
+    """
+
+    def __init__(self, epsilon=CMS_EPSILON, delta=CMS_DELTA, seed=0):
+        """
+        Args:
+            epsilon: Overcount bound as a share of the total count.
+            delta: Probability of exceeding that bound.
+            seed: Selects the hash functions (must match to merge).
+        """
+        self.epsilon, self.delta, self.seed = epsilon, delta, seed
+        self.width = math.ceil(math.e / epsilon)
+        self.depth = math.ceil(math.log(1 / delta))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+
+    def _columns(self, keys) -> np.ndarray:
+        """The counter column of each key in each row (depth x len(keys)), hashed vectorized."""
+        keys = np.asarray(keys, dtype=object)
+        return np.stack([
+            pd.util.hash_array(keys, hash_key=f"{self.seed:08d}{row:08d}") % np.uint64(self.width)
+            for row in range(self.depth)
+        ]).astype(np.int64)
+
+    def update(self, keys, counts=None):
+        """
+        Adds a batch of keys.
+
+        Args:
+            keys: Array-like of string keys.
+            counts: Count of each key (default 1 each).
+        """
+        counts = np.ones(len(keys), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        for row, columns in enumerate(self._columns(keys)):
+            self.table[row] += np.bincount(columns, weights=counts, minlength=self.width).astype(np.int64)
+        self.total += int(counts.sum())
+
+    def estimate(self, keys) -> np.ndarray:
+        """
+        Args:
+            keys: Array-like of string keys.
+
+        Returns:
+            np.ndarray: The estimated count of each key.
+        """
+        columns = self._columns(keys)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def merge(self, other):
+        """Adds the counts of another sketch with the same parameters into this one."""
+        if (self.width, self.depth, self.seed) != (other.width, other.depth, other.seed):
+            raise ValueError("Only count-min sketches with the same epsilon, delta and seed can be merged")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+    def to_dict(self) -> dict:
+        return {'epsilon': self.epsilon, 'delta': self.delta, 'seed': self.seed, 'total': self.total,
+                'table': self.table.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['epsilon'], data['delta'], data['seed'])
+        sketch.table = np.asarray(data['table'], dtype=np.int64).reshape(sketch.depth, sketch.width)
+        sketch.total = data['total']
+        return sketch
+
+
+# --- 2. QUANTILE SKETCH
+class QuantileSketch:
+    """
+    Approximate quantiles of positive values (e.g. BMI, heart_rate) from counts in logarithmic buckets,
+    as in DDSketch: a value x falls in bucket ceil(log(x) / log(gamma)) with gamma = (1 + a) / (1 - a).
+
+    Error bound: every quantile is returned within relative error `accuracy` (a) of the exact quantile
+    of the values added; e.g. accuracy=0.01 returns a median BMI of 25 as 24.75-25.25.
+    The number of buckets grows with log(max / min), not with the number of values
+    (about 170 buckets for values between 10 and 300 at accuracy=0.01). Values <= 0 and NaN are skipped.
+
+    Sketches with the same accuracy can be merged by adding their bucket counts.
+    """
+
+    def __init__(self, accuracy=QUANTILE_ACCURACY):
+        """
+        Args:
+            accuracy: The relative error bound of every quantile.
+        """
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.buckets = {}
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values):
+        """
+        Adds a batch of values.
+
+        Args:
+            values: Array-like of numbers.
+        """
+        values = np.asarray(values, dtype=float)
+        values = values[values > 0]
+        if len(values) == 0:
+            return
+        index, counts = np.unique(np.ceil(np.log(values) / math.log(self.gamma)).astype(np.int64), return_counts=True)
+        for i, n in zip(index.tolist(), counts.tolist()):
+            self.buckets[i] = self.buckets.get(i, 0) + n
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def quantiles(self, qs) -> np.ndarray:
+        """
+        Args:
+            qs: Quantiles between 0 and 1.
+
+        Returns:
+            np.ndarray: The estimated value at each quantile (NaN if the sketch is empty).
+        """
+        qs = np.asarray(qs, dtype=float)
+        if self.count == 0:
+            return np.full(qs.shape, np.nan)
+        index = np.array(sorted(self.buckets))
+        cumulative = np.cumsum([self.buckets[i] for i in index])
+        # The bucket holding the value of rank q * (count - 1), counted from 0
+        bucket = index[np.searchsorted(cumulative, qs * (self.count - 1), side='right')]
+        values = 2 * self.gamma ** bucket / (self.gamma + 1)
+        return np.clip(values, self.min, self.max)
+
+    def merge(self, other):
+        """Adds the buckets of another sketch with the same accuracy into this one."""
+        if self.accuracy != other.accuracy:
+            raise ValueError("Only quantile sketches with the same accuracy can be merged")
+        for i, n in other.buckets.items():
+            self.buckets[i] = self.buckets.get(i, 0) + n
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def to_dict(self) -> dict:
+        return {'accuracy': self.accuracy, 'count': self.count, 'min': self.min, 'max': self.max,
+                'buckets': {str(i): n for i, n in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['accuracy'])
+        sketch.buckets = {int(i): n for i, n in data['buckets'].items()}
+        sketch.count, sketch.min, sketch.max = data['count'], data['min'], data['max']
+        return sketch
+
+
+# --- 3. APPROXIMATE RESULT AGGREGATES
+class ResultSketch:
+    """
+    Mergeable sketches of the final results (full_df), updated one batch at a time, from which the
+    tables of analyze_assigned_diseases and the BMI/heart rate distributions of analyze_dem_info are
+    approximated without keeping the rows.
+
+    Disease counts by Sex and by Age_Bin come from one CountMinSketch; the (few) distinct diseases,
+    sexes and age bins seen are kept exactly so the tables can be enumerated. BMI and heart_rate
+    quantiles are kept per Sex and Age_Bin in QuantileSketches.
+    """
+
+    def __init__(self, epsilon=CMS_EPSILON, delta=CMS_DELTA, accuracy=QUANTILE_ACCURACY):
+        self.counts = CountMinSketch(epsilon, delta)
+        self.accuracy = accuracy
+        self.labels = {'Assigned_Disease': set(), 'Sex': set(), 'Age_Bin': set()}
+        self.distributions = {}
+        self.rows = 0
+
+    def update(self, full_df):
+        """
+        Adds a batch of results.
+
+        Args:
+            full_df: A DataFrame with Assigned_Disease, Sex, Age_Bin, BMI and heart_rate columns
+                     (e.g. from assign_disease or apply_disease_model).
+        """
+        assigned = full_df[full_df['Assigned_Disease'].notna()]
+        disease = assigned['Assigned_Disease'].astype(str)
+        keys = pd.concat([
+            'disease|' + disease,
+            'sex|' + disease + '|' + assigned['Sex'].astype(str),
+            'age|' + disease + '|' + assigned['Age_Bin'].astype(str),
+        ])
+        self.counts.update(keys.to_numpy())
+        for col in self.labels:
+            self.labels[col].update(full_df[col].dropna().astype(str).unique().tolist())
+
+        for (sex, age_bin), group in full_df.groupby(['Sex', 'Age_Bin'], observed=True):
+            for col in ('BMI', 'heart_rate'):
+                key = f"{col}|{sex}|{age_bin}"
+                self.distributions.setdefault(key, QuantileSketch(self.accuracy)).update(group[col].to_numpy())
+        self.rows += len(full_df)
+
+    def merge(self, other):
+        """Adds another ResultSketch (e.g. of another shard or time period) into this one."""
+        self.counts.merge(other.counts)
+        for col in self.labels:
+            self.labels[col] |= other.labels[col]
+        for key, sketch in other.distributions.items():
+            self.distributions.setdefault(key, QuantileSketch(sketch.accuracy)).merge(sketch)
+        self.rows += other.rows
+        return self
+
+    def disease_tables(self) -> tuple:
+        """
+        Approximates analyze_assigned_diseases (each count overestimates by at most epsilon times the
+        number of assigned rows x 3, with probability 1 - delta).
+
+        Returns:
+            tuple: (disease_counts, disease_sex, disease_age) as from analyze_assigned_diseases.
+        """
+        diseases = sorted(self.labels['Assigned_Disease'])
+        short_names = {'Nutrition, Physical Activity, and Weight Status': 'NPW'}
+
+        disease_counts = pd.Series(self.counts.estimate([f"disease|{d}" for d in diseases]), index=diseases, name='count')
+        disease_counts = disease_counts[disease_counts > 0].sort_values(ascending=False).rename(index=short_names)
+        disease_counts.index.name = 'Assigned_Disease'
+
+        def table(prefix, col):
+            values = sorted(self.labels[col])
+            estimates = self.counts.estimate([f"{prefix}|{d}|{v}" for d in diseases for v in values])
+            frame = pd.DataFrame(estimates.reshape(len(diseases), len(values)), index=diseases, columns=values)
+            frame = frame.loc[frame.sum(axis=1) > 0, frame.sum(axis=0) > 0].rename(index=short_names).sort_index()
+            frame.index.name, frame.columns.name = 'Assigned_Disease', col
+            return frame
+
+        return disease_counts, table('sex', 'Sex'), table('age', 'Age_Bin')
+
+    def distribution(self, col, sex=None, age_bin=None) -> QuantileSketch:
+        """The merged QuantileSketch of BMI or heart_rate, optionally for one Sex and/or Age_Bin."""
+        merged = QuantileSketch(self.accuracy)
+        for key, sketch in self.distributions.items():
+            name, key_sex, key_age = key.split('|')
+            if name == col and sex in (None, key_sex) and age_bin in (None, key_age):
+                merged.merge(sketch)
+        return merged
+
+    def to_dict(self) -> dict:
+        return {'rows': self.rows, 'accuracy': self.accuracy, 'counts': self.counts.to_dict(),
+                'labels': {col: sorted(values) for col, values in self.labels.items()},
+                'distributions': {key: sketch.to_dict() for key, sketch in self.distributions.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['counts']['epsilon'], data['counts']['delta'], data['accuracy'])
+        sketch.counts = CountMinSketch.from_dict(data['counts'])
+        sketch.labels = {col: set(values) for col, values in data['labels'].items()}
+        sketch.distributions = {key: QuantileSketch.from_dict(value) for key, value in data['distributions'].items()}
+        sketch.rows = data['rows']
+        return sketch
+
+
+def save_sketch(sketch, path):
+    """Writes a ResultSketch as JSON."""
+    with open(path, 'w') as f:
+        json.dump(sketch.to_dict(), f)
+
+
+def load_sketches(paths) -> ResultSketch:
+    """
+    Loads and merges ResultSketches, e.g. one per shard.
+
+    Args:
+        paths: JSON files written by save_sketch.
+
+    Returns:
+        ResultSketch: The merged sketch.
+    """
+    merged = None
+    for path in paths:
+        with open(path) as f:
+            sketch = ResultSketch.from_dict(json.load(f))
+        merged = sketch if merged is None else merged.merge(sketch)
+    return merged
@@ -0,0 +1,156 @@
+import sqlite3
+import contextlib
+from pathlib import Path
+import pandas as pd
+from config import RESULTS_DB
+
+
+RESULTS_TABLE = 'final_results'
+ROLLUP_TABLE = 'disease_rollup'
+
+# Query keyword -> indexed column of final_results
+FILTER_COLUMNS = {'sex': 'Sex', 'age_bin': 'Age_Bin', 'device': 'Device', 'disease': 'Assigned_Disease'}
+
+
+@contextlib.contextmanager
+def _connect(db_path, read_only=False):
+    """Opens (and always closes) a connection, committing on success. Read-only connections never create the file."""
+    if read_only:
+        conn = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True)
+    else:
+        conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+# --- 1. PUBLISH RESULTS
+def publish_results(full_df, db_path=RESULTS_DB) -> bool:
+    """
+    Publishes the final results into an indexed SQLite database.
+    Creates one index per filter column, a composite index, and a disease_rollup table with
+    precomputed counts (and mean BMI / heart_rate with their non-null counts) per Assigned_Disease,
+    Sex, Age_Bin and Device.
+
+    Args:
+        full_df: The DataFrame created after running assign_disease from augment.py
+                 (needs the Sex, Age_Bin, Device, Assigned_Disease, BMI and heart_rate columns).
+        db_path: The SQLite file to write. Existing tables are replaced.
+
+    Returns:
+        bool: True if the results were published.
+    """
+    try:
+        print(f"Publishing results to {db_path}...")
+        dims = ', '.join(f'"{col}"' for col in FILTER_COLUMNS.values())
+
+        with _connect(db_path) as conn:
+            full_df.to_sql(RESULTS_TABLE, conn, if_exists='replace', index=False, chunksize=50_000)
+
+            for col in FILTER_COLUMNS.values():
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{RESULTS_TABLE}_{col}" ON {RESULTS_TABLE} ("{col}")')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{RESULTS_TABLE}_all" ON {RESULTS_TABLE} ({dims})')
+
+            conn.execute(f'DROP TABLE IF EXISTS {ROLLUP_TABLE}')
+            conn.execute(
+                f'CREATE TABLE {ROLLUP_TABLE} AS '
+                f'SELECT {dims}, COUNT(*) AS n, COUNT("BMI") AS n_bmi, AVG("BMI") AS mean_bmi, '
+                f'COUNT("heart_rate") AS n_heart_rate, AVG("heart_rate") AS mean_heart_rate '
+                f'FROM {RESULTS_TABLE} GROUP BY {dims}'
+            )
+            conn.execute(f'CREATE INDEX "idx_{ROLLUP_TABLE}_all" ON {ROLLUP_TABLE} ({dims})')
+            conn.execute('ANALYZE')
+
+        print("Results published.")
+        return True
+
+    except Exception as e:
+        print(f"Could not publish results: {e}")
+        return False
+
+
+# --- 2. QUERY RESULTS
+def _where(filters) -> tuple:
+    """Builds a WHERE clause from FILTER_COLUMNS keywords. A value of None matches rows without a disease."""
+    clauses, params = [], []
+    for key, value in filters.items():
+        if key not in FILTER_COLUMNS:
+            raise ValueError(f"Unknown filter {key!r}; expected one of {sorted(FILTER_COLUMNS)}")
+        if value is None:
+            clauses.append(f'"{FILTER_COLUMNS[key]}" IS NULL')
+        else:
+            clauses.append(f'"{FILTER_COLUMNS[key]}" = ?')
+            params.append(value)
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def count_cases(db_path=RESULTS_DB, **filters) -> int:
+    """
+    Counts result rows matching the filters using the precomputed rollup.
+    e.g. count_cases(disease='Arthritis', age_bin='45-64', sex='Female', device='Fitbit')
+
+    Args:
+        db_path: The SQLite file written by publish_results.
+        **filters: Any of sex, age_bin, device, disease.
+
+    Returns:
+        int: The number of matching rows.
+    """
+    where, params = _where(filters)
+    with _connect(db_path, read_only=True) as conn:
+        (count,) = conn.execute(f'SELECT COALESCE(SUM(n), 0) FROM {ROLLUP_TABLE}{where}', params).fetchone()
+    return int(count)
+
+
+def rollup(db_path=RESULTS_DB, by=('Assigned_Disease',), **filters) -> pd.DataFrame:
+    """
+    Aggregates the precomputed rollup by any of the indexed columns.
+    e.g. rollup(by=['Assigned_Disease', 'Sex']) gives the counts behind the disease-by-sex plot.
+
+    Args:
+        db_path: The SQLite file written by publish_results.
+        by: Columns of FILTER_COLUMNS to group by.
+        **filters: Any of sex, age_bin, device, disease.
+
+    Returns:
+        pd.DataFrame: One row per group with the count n and the mean BMI and heart_rate over the rows
+                      where they are not missing.
+    """
+    unknown = [col for col in by if col not in FILTER_COLUMNS.values()]
+    if unknown:
+        raise ValueError(f"Cannot group by {unknown}; expected columns of {sorted(FILTER_COLUMNS.values())}")
+
+    group = ', '.join(f'"{col}"' for col in by)
+    where, params = _where(filters)
+    sql = (
+        f'SELECT {group}, SUM(n) AS n, SUM(mean_bmi * n_bmi) / SUM(n_bmi) AS mean_bmi, '
+        f'SUM(mean_heart_rate * n_heart_rate) / SUM(n_heart_rate) AS mean_heart_rate '
+        f'FROM {ROLLUP_TABLE}{where} GROUP BY {group} ORDER BY n DESC'
+    )
+    with _connect(db_path, read_only=True) as conn:
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+def query_results(db_path=RESULTS_DB, columns=None, limit=None, **filters) -> pd.DataFrame:
+    """
+    Returns the result rows matching the filters, using the column indexes.
+
+    Args:
+        db_path: The SQLite file written by publish_results.
+        columns: Columns to return (default all).
+        limit: Maximum number of rows to return.
+        **filters: Any of sex, age_bin, device, disease.
+
+    Returns:
+        pd.DataFrame: The matching rows.
+    """
+    select = ', '.join(f'"{col}"' for col in columns) if columns else '*'
+    where, params = _where(filters)
+    sql = f'SELECT {select} FROM {RESULTS_TABLE}{where}'
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(int(limit))
+    with _connect(db_path, read_only=True) as conn:
+        return pd.read_sql_query(sql, conn, params=params)
@@ -0,0 +1,259 @@
+import os
+import csv
+import json
+import math
+import time
+import socket
+from collections import OrderedDict, deque
+
+
+# Raw aw_fb_data.csv columns that identify one participant
+PARTICIPANT_COLUMNS = ['age', 'gender', 'height', 'weight', 'device']
+NUMERIC_COLUMNS = ['age', 'height', 'weight', 'hear_rate', 'sd_norm_heart', 'resting_heart', 'intensity_karvonen']
+
+
+# --- 1. PER-EVENT FEATURES
+def clean_reading(raw) -> dict:
+    """
+    Per-event version of process_aw_fb_data: cleans and engineers the features of a single reading.
+    The formulas are kept identical to process_aw_fb_data so both paths flag the same rows.
+
+    Args:
+        raw: A dict with the aw_fb_data.csv schema. Values may be strings (e.g. from a CSV line).
+
+    Returns:
+        dict: The cleaned reading with the same keys as the columns of process_aw_fb_data.
+
+    Raises:
+        ValueError: If a numeric column is not a finite number (e.g. 'nan'), which would otherwise
+                    stay in the participant's running window sums.
+    """
+    values = {col: float(raw[col]) for col in NUMERIC_COLUMNS}
+    bad = [col for col, value in values.items() if not math.isfinite(value)]
+    if bad:
+        raise ValueError(f"non-finite values in {bad}")
+    age = values['age']
+    bmi = values['weight'] / ((values['height'] / 100) ** 2)
+    heart_rate = values['hear_rate']
+    sd_norm_heart = values['sd_norm_heart']
+    resting_heart = values['resting_heart']
+    intensity_karvonen = values['intensity_karvonen']
+    target_heart_rate = resting_heart + (heart_rate - resting_heart) * intensity_karvonen
+
+    return {
+        'Device': {'apple watch': 'Apple Watch', 'fitbit': 'Fitbit'}.get(raw['device']),
+        'Activity': raw['activity'],
+        'Sex': {0: 'Female', 1: 'Male'}.get(int(float(raw['gender']))),
+        'Age': age,
+        'Age_Bin': '18-44' if 18 <= age <= 44 else ('45-64' if 45 <= age <= 64 else ('65+' if age >= 65 else 'other')),
+        'Height_cm': values['height'],
+        'Weight_kg': values['weight'],
+        'BMI': bmi,
+        'heart_rate': heart_rate,
+        'sd_norm_heart': sd_norm_heart,
+        'resting_heart': resting_heart,
+        'intensity_karvonen': intensity_karvonen,
+        'target_heart_rate': target_heart_rate,
+        'Disease': 1 if (heart_rate > target_heart_rate + 2 * sd_norm_heart) and
+                        (heart_rate > target_heart_rate - 2 * sd_norm_heart) else 0,
+        'Possible Obesity': 1 if (18.5 <= bmi > 18.5 <= 24.9) else 0,
+    }
+
+
+# --- 2. SLIDING-WINDOW DETECTOR
+class StreamingDetector:
+    """
+    Computes the process_aw_fb_data features and Disease flag per event and keeps a sliding
+    window of the last `window` readings per participant.
+
+    Memory is bounded: each window holds at most `window` readings, at most `max_participants`
+    windows are kept (least recently seen participants are evicted) and only the last
+    `latency_window` alert latencies are kept.
+    """
+
+    def __init__(self, window=20, min_exceedances=1, max_participants=10000, latency_window=10000, on_alert=None):
+        """
+        Args:
+            window: Readings kept per participant.
+            min_exceedances: Flagged readings (Disease == 1) needed within the window to raise an alert.
+            max_participants: Participant windows kept before the least recently seen is evicted.
+            latency_window: Number of most recent alert latencies kept for percentiles.
+            on_alert: Called with each alert dict. Defaults to printing the alert.
+        """
+        self.window = window
+        self.min_exceedances = min_exceedances
+        self.max_participants = max_participants
+        self.on_alert = on_alert if on_alert is not None else self._print_alert
+        self.latencies = deque(maxlen=latency_window)
+        self.events = 0
+        self.alerts = 0
+        self.errors = 0
+        # participant -> [readings deque of (heart_rate, flag), sum, sum of squares, exceedances]
+        self._windows = OrderedDict()
+
+    @staticmethod
+    def _print_alert(alert):
+        print(f"ALERT {alert['participant']}: heart_rate {alert['heart_rate']:.1f} > target {alert['target_heart_rate']:.1f}, "
+              f"{alert['exceedances']}/{alert['window_size']} recent readings flagged")
+
+    def _update_window(self, participant, heart_rate, flag) -> list:
+        state = self._windows.get(participant)
+        if state is None:
+            state = [deque(), 0.0, 0.0, 0]
+            self._windows[participant] = state
+            if len(self._windows) > self.max_participants:
+                self._windows.popitem(last=False)
+        else:
+            self._windows.move_to_end(participant)
+
+        readings = state[0]
+        if len(readings) == self.window:
+            old_rate, old_flag = readings.popleft()
+            state[1] -= old_rate
+            state[2] -= old_rate * old_rate
+            state[3] -= old_flag
+        readings.append((heart_rate, flag))
+        state[1] += heart_rate
+        state[2] += heart_rate * heart_rate
+        state[3] += flag
+        return state
+
+    def process(self, raw, received=None):
+        """
+        Processes one raw reading.
+
+        Args:
+            raw: A dict with the aw_fb_data.csv schema.
+            received: perf_counter() timestamp at which the reading was read; defaults to now.
+
+        Returns:
+            dict or None: The alert raised by this reading, if any.
+        """
+        if received is None:
+            received = time.perf_counter()
+        self.events += 1
+
+        try:
+            reading = clean_reading(raw)
+        except (KeyError, ValueError, TypeError, ZeroDivisionError):
+            self.errors += 1
+            return None
+
+        participant = tuple(raw[col] for col in PARTICIPANT_COLUMNS)
+        readings, total, total_sq, exceedances = self._update_window(participant, reading['heart_rate'], reading['Disease'])
+
+        if not reading['Disease'] or exceedances < self.min_exceedances:
+            return None
+
+        n = len(readings)
+        mean = total / n
+        # Sample SD (ddof=1), as heart_rate_roll_var in add_rolling_heart_features; NaN for a single reading
+        window_sd = math.sqrt(max(total_sq - n * mean * mean, 0.0) / (n - 1)) if n > 1 else math.nan
+        alert = {
+            'participant': participant,
+            'Activity': reading['Activity'],
+            'heart_rate': reading['heart_rate'],
+            'target_heart_rate': reading['target_heart_rate'],
+            'Possible Obesity': reading['Possible Obesity'],
+            'window_size': n,
+            'window_mean': mean,
+            'window_sd': window_sd,
+            'exceedances': exceedances,
+        }
+        self.alerts += 1
+        self.on_alert(alert)
+        self.latencies.append(time.perf_counter() - received)
+        return alert
+
+    def run(self, events) -> dict:
+        """
+        Processes every reading yielded by `events`: raw dicts, or (raw, received) pairs as yielded by
+        follow_file and follow_socket, whose arrival times make alert latencies include the read delay.
+
+        Returns:
+            dict: The detector stats once `events` is exhausted.
+        """
+        for event in events:
+            if isinstance(event, tuple):
+                self.process(*event)
+            else:
+                self.process(event)
+        return self.stats()
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: Event/alert counters, tracked participants and alert latency percentiles (ms).
+        """
+        stats = {'events': self.events, 'alerts': self.alerts, 'errors': self.errors, 'participants': len(self._windows)}
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            for p in (50, 99):
+                stats[f'p{p}_ms'] = ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000
+            stats['max_ms'] = ordered[-1] * 1000
+        return stats
+
+
+# --- 3. SOURCES
+def follow_file(filepath, poll_interval=0.1, from_start=True, idle_timeout=None):
+    """
+    Follows an append-only CSV file with the aw_fb_data.csv header, like `tail -f`.
+
+    Args:
+        filepath: The CSV file to follow. The first line must be the header.
+        poll_interval: Seconds to sleep when no new line is available. This bounds the delay
+                       between a line being appended and it being processed.
+        from_start: If False, lines already in the file are skipped.
+        idle_timeout: Stop after this many seconds without new lines (None follows forever).
+
+    Yields:
+        tuple: (raw reading dict, received) per appended line, where received is the perf_counter() time
+               the line arrived, estimated from the file's modification time so the polling delay counts.
+    """
+    with open(filepath, newline='') as f:
+        header = next(csv.reader([f.readline()]))
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+
+        buffer = ''
+        idle_since = time.monotonic()
+        while True:
+            line = f.readline()
+            if not line:
+                if idle_timeout is not None and time.monotonic() - idle_since > idle_timeout:
+                    return
+                time.sleep(poll_interval)
+                continue
+
+            buffer += line
+            if not buffer.endswith('\n'):
+                # A partially written line; wait for the rest of it.
+                continue
+            idle_since = time.monotonic()
+            line, buffer = buffer, ''
+            if line.strip():
+                received = time.perf_counter() - max(0.0, time.time() - os.fstat(f.fileno()).st_mtime)
+                yield dict(zip(header, next(csv.reader([line])))), received
+
+
+def follow_socket(host, port):
+    """
+    Reads newline-delimited JSON readings (aw_fb_data.csv schema) from a TCP socket until it closes.
+
+    Args:
+        host: The host to connect to.
+        port: The port to connect to.
+
+    Yields:
+        tuple: (raw reading dict, received) per line, where received is the perf_counter() time the line
+               was read. The reading is None for a line that is not valid JSON (StreamingDetector.process
+               counts it as an error, like a bad CSV row).
+    """
+    with socket.create_connection((host, port)) as sock, sock.makefile('r') as lines:
+        for line in lines:
+            received = time.perf_counter()
+            if line.strip():
+                try:
+                    yield json.loads(line), received
+                except ValueError:
+                    yield None, received
@@ -1,8 +1,29 @@
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import tempfile
+import asyncio
 import unittest
+import subprocess
 import pandas as pd
 from load import get_csv, get_chronic_data
-from process import process_aw_fb_data, process_chronic_data, process_nutri_data
-from augment import predict_sex_age_nutri, assign_disease
+from process import process_aw_fb_data, add_rolling_heart_features, process_chronic_data, process_nutri_data
+from augment import predict_sex_age_nutri, predict_sex_age_chronic, predict_sex_age_parallel, assign_disease, fit_disease_model
+from serve import ScoringService
+from stream import clean_reading, StreamingDetector, follow_file, follow_socket
+from store import publish_results, count_cases, rollup, query_results
+from partition import write_partitions, read_partitions, read_manifest, process_partitioned
+from tune import choose_params, tune_all
+from analyze import analyze_assigned_diseases
+from sample import stratified_sample, fit_within_budget, budget_report
+from writer import ArtifactWriter
+from cache import ResultCache, cached, fingerprint
+from changes import detect_changes, save_index, touched
+from sketch import CountMinSketch, QuantileSketch, ResultSketch, save_sketch, load_sketches
+import augment
 
 
 # Test if data is loaded properly
@@ -46,7 +67,63 @@ class TestProcessing(unittest.TestCase):
         self.assertGreater(len(processed), 0, "Processed aw_fb data is empty.")
         for col in expected_columns:
             self.assertIn(col, processed.columns, f"Processed data missing column: {col}")
-    
+
+    def test_process_aw_fb_data_flags(self):
+        test_df = pd.DataFrame({
+            'device': ['fitbit'] * 4,
+            'activity': ['Lying'] * 4,
+            'gender': [0, 1, 0, 1],
+            'age': [30, 44.5, 70, 12],
+            'height': [170, 170, 150, 180],
+            'weight': [70, 50, 90, 55],
+            'hear_rate': [120, 80, 150, 70],
+            'sd_norm_heart': [5, 5, 1, 5],
+            'resting_heart': [70, 70, 60, 60],
+            'intensity_karvonen': [0.5, 0.5, 0.2, 0.5]
+        })
+
+        processed = process_aw_fb_data(test_df)
+        self.assertListEqual(processed['Age_Bin'].tolist(), ['18-44', 'other', '65+', 'other'])
+        self.assertListEqual(processed['Disease'].tolist(), [1, 0, 1, 0])
+        self.assertListEqual(processed['Possible Obesity'].tolist(), [1, 0, 1, 0])
+
+    def test_add_rolling_heart_features(self):
+        group_cols = ['Age', 'Height_cm', 'Weight_kg', 'Sex', 'Device', 'Activity']
+        test_df = pd.DataFrame({
+            'Age': [30, 30, 40, 30, 30, 40, 30],
+            'Height_cm': [170] * 7,
+            'Weight_kg': [70] * 7,
+            'Sex': ['Female'] * 7,
+            'Device': ['Fitbit'] * 7,
+            'Activity': ['Lying', 'Lying', 'Lying', 'Sitting', 'Lying', 'Lying', 'Lying'],
+            'heart_rate': [80.0, 90.0, 100.0, 70.0, 110.0, 60.0, 85.0],
+            'Disease': [0, 1, 1, 0, 1, 0, 1]
+        })
+
+        before = test_df.copy()
+        processed = add_rolling_heart_features(test_df, window=3)
+        self.assertIsNotNone(processed, "Adding rolling features returned None.")
+        pd.testing.assert_frame_equal(test_df, before, obj="The input of add_rolling_heart_features")
+
+        rolling = test_df.groupby(group_cols)['heart_rate'].rolling(3, min_periods=1)
+        expected_mean = rolling.mean().droplevel(group_cols).sort_index()
+        expected_var = rolling.var().droplevel(group_cols).sort_index()
+        expected_max = rolling.max().droplevel(group_cols).sort_index()
+        expected_count = test_df.groupby(group_cols)['Disease'].rolling(3, min_periods=1).sum().droplevel(group_cols).sort_index()
+
+        pd.testing.assert_series_equal(processed['heart_rate_roll_mean'], expected_mean, check_names=False)
+        pd.testing.assert_series_equal(processed['heart_rate_roll_var'], expected_var, check_names=False)
+        pd.testing.assert_series_equal(processed['heart_rate_roll_max'], expected_max, check_names=False)
+        self.assertListEqual(processed['exceed_roll_count'].tolist(), expected_count.astype(int).tolist())
+
+        # A missing heart rate is skipped in its windows instead of making every window NaN
+        test_df.loc[1, 'heart_rate'] = float('nan')
+        processed = add_rolling_heart_features(test_df.copy(), window=3)
+        rolling = test_df.groupby(group_cols)['heart_rate'].rolling(3, min_periods=1)
+        pd.testing.assert_series_equal(processed['heart_rate_roll_mean'], rolling.mean().droplevel(group_cols).sort_index(), check_names=False)
+        pd.testing.assert_series_equal(processed['heart_rate_roll_var'], rolling.var().droplevel(group_cols).sort_index(), check_names=False)
+        pd.testing.assert_series_equal(processed['heart_rate_roll_max'], rolling.max().droplevel(group_cols).sort_index(), check_names=False)
+
     def test_process_chronic_data(self):
         # Expected columns in the processed output
         expected_age_columns = ['YearStart', 'YearEnd', 'LocationDesc', 'Topic', 'age_bin']
@@ -170,6 +247,32 @@ class TestAugmentationAndAnalysis(unittest.TestCase):
         self.assertIn("Age_Bin", result.columns)
         self.assertGreater(len(result), 0)
 
+    def test_predict_sex_age_parallel_matches_serial(self):
+        feature_cols = ['YearStart', 'YearEnd', 'LocationDesc', 'Topic']
+        train = pd.DataFrame([
+            [2015, 2016, "LocationA", "Asthma"],
+            [2016, 2016, "LocationB", "Arthritis"],
+            [2017, 2018, "LocationA", "Arthritis"],
+            [2015, 2016, "LocationC", "Asthma"]
+        ], columns=feature_cols)
+        sex_df = train.assign(Sex=['Female', 'Male', 'Male', 'Female'])
+        age_df = train.assign(age_bin=['18-44', '45-64', '65+', '18-44'])
+        race_df = train.assign(**{'Race/Ethnicity': ['Hispanic', 'Asian', 'White', 'Asian']})
+
+        serial_nutri = predict_sex_age_nutri(sex_df, age_df, race_df.copy())
+        serial_chronic = predict_sex_age_chronic(sex_df, age_df, race_df.copy())
+        parallel_nutri, parallel_chronic = predict_sex_age_parallel(sex_df, age_df, race_df.copy(),
+                                                                    sex_df, age_df, race_df.copy(), max_workers=2)
+
+        pd.testing.assert_frame_equal(parallel_nutri, serial_nutri)
+        pd.testing.assert_frame_equal(parallel_chronic, serial_chronic)
+
+        # The row budget applies to the parallel chronic fits too
+        serial_chronic = predict_sex_age_chronic(sex_df, age_df, race_df.copy(), max_rows=2)
+        _, parallel_chronic = predict_sex_age_parallel(sex_df, age_df, race_df.copy(), sex_df, age_df, race_df.copy(),
+                                                       max_workers=2, max_rows=2)
+        pd.testing.assert_frame_equal(parallel_chronic, serial_chronic)
+
     def test_assign_disease(self):
 
         second_disease_df = pd.DataFrame({
@@ -201,6 +304,620 @@ class TestAugmentationAndAnalysis(unittest.TestCase):
             else:
                 self.assertIsNone(row['Assigned_Disease'], "Assignment should not exist when conditions are not satisfied.")
 
+    def test_assign_disease_min_exceedances(self):
+        second_disease_df = pd.DataFrame({
+            'Sex': ['Female', 'Male'],
+            'Age_Bin': ['18-44', '18-44'],
+            'Obesity_Binary': [1, 1],
+            'Topic': ['Heart', 'Obesity']
+        })
+
+        aw_fb_df = pd.DataFrame({
+            'Sex': ['Female', 'Female', 'Female'],
+            'Age_Bin': ['18-44', '18-44', '18-44'],
+            'Disease': [1, 1, 0],
+            'Possible Obesity': [1, 1, 1],
+            'exceed_roll_count': [1, 2, 2]
+        })
+
+        result = assign_disease(second_disease_df, aw_fb_df, min_exceedances=2)
+        self.assertListEqual(result['Assigned_Disease'].notnull().tolist(), [False, True, True])
+
+    def test_inputs_not_modified(self):
+        feature_cols = ['YearStart', 'YearEnd', 'LocationDesc', 'Topic']
+        train = pd.DataFrame([
+            [2015, 2016, "LocationA", "Obesity / Weight Status"],
+            [2016, 2016, "LocationB", "Arthritis"]
+        ], columns=feature_cols)
+        sex_df = train.assign(Sex=['Female', 'Male'])
+        age_df = train.assign(age_bin=['18-44', '45-64'])
+        race_df = train.assign(**{'Race/Ethnicity': ['Hispanic', 'Asian']})
+        race_before = race_df.copy()
+
+        nutri_combined = predict_sex_age_nutri(sex_df, age_df, race_df)
+        chronic_combined = predict_sex_age_chronic(sex_df, age_df, race_df)
+        pd.testing.assert_frame_equal(race_df, race_before)
+
+        combined_before = nutri_combined.copy()
+        second_disease_df = augment.predict_obesity(nutri_combined, chronic_combined)
+        self.assertIn('Obesity_Binary', second_disease_df.columns)
+        pd.testing.assert_frame_equal(nutri_combined, combined_before)
+        self.assertNotIn('Obesity_Binary', chronic_combined.columns)
+
+        full_df = pd.DataFrame({
+            'Sex': ['Female', 'Male'],
+            'Age_Bin': ['18-44', '45-64'],
+            'Assigned_Disease': ['Nutrition, Physical Activity, and Weight Status', None]
+        })
+        disease_counts, disease_sex, _ = analyze_assigned_diseases(full_df)
+        self.assertListEqual(disease_sex.index.tolist(), ['NPW'])
+        self.assertEqual(disease_counts['NPW'], 1)
+        self.assertEqual(full_df.loc[0, 'Assigned_Disease'], 'Nutrition, Physical Activity, and Weight Status')
+
+
+# Test the indexed query store
+class TestResultsStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, 'results.db')
+        self.full_df = pd.DataFrame({
+            'Device': ['Fitbit', 'Fitbit', 'Apple Watch', 'Fitbit', 'Fitbit'],
+            'Sex': ['Female', 'Female', 'Female', 'Male', 'Female'],
+            'Age_Bin': ['45-64', '45-64', '45-64', '45-64', '18-44'],
+            'BMI': [30.0, 20.0, 25.0, 22.0, 24.0],
+            'heart_rate': [100.0, 80.0, 90.0, 70.0, 60.0],
+            'Assigned_Disease': ['Arthritis', 'Arthritis', 'Arthritis', 'Arthritis', None]
+        })
+        self.assertTrue(publish_results(self.full_df, db_path=self.db_path))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_count_cases(self):
+        self.assertEqual(count_cases(self.db_path, disease='Arthritis', sex='Female', age_bin='45-64', device='Fitbit'), 2)
+        self.assertEqual(count_cases(self.db_path, disease=None), 1)
+        self.assertEqual(count_cases(self.db_path), len(self.full_df))
+        with self.assertRaises(ValueError):
+            count_cases(self.db_path, colour='red')
+
+    def test_rollup_and_query(self):
+        by_sex = rollup(self.db_path, by=['Sex'], disease='Arthritis').set_index('Sex')
+        self.assertEqual(by_sex.loc['Female', 'n'], 3)
+        self.assertAlmostEqual(by_sex.loc['Female', 'mean_bmi'], 25.0)
+
+        rows = query_results(self.db_path, columns=['BMI'], sex='Female', device='Fitbit', disease='Arthritis')
+        self.assertListEqual(sorted(rows['BMI']), [20.0, 30.0])
+
+    def test_rollup_skips_missing_bmi(self):
+        # A group with only missing BMI, and a group with one missing BMI
+        with_missing = pd.concat([self.full_df, pd.DataFrame({
+            'Device': ['Apple Watch', 'Fitbit'], 'Sex': ['Male', 'Female'], 'Age_Bin': ['18-44', '45-64'],
+            'BMI': [float('nan'), float('nan')], 'heart_rate': [75.0, 85.0], 'Assigned_Disease': ['Arthritis', 'Arthritis']
+        })], ignore_index=True)
+        self.assertTrue(publish_results(with_missing, db_path=self.db_path))
+        by_disease = rollup(self.db_path, by=['Assigned_Disease'], disease='Arthritis').set_index('Assigned_Disease')
+        self.assertEqual(by_disease.loc['Arthritis', 'n'], 6)
+        self.assertAlmostEqual(by_disease.loc['Arthritis', 'mean_bmi'], with_missing.loc[with_missing['Assigned_Disease'] == 'Arthritis', 'BMI'].mean())
+
+
+# Test partitioned processing of the surveillance data
+class TestPartitioning(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.part_dir = os.path.join(self.tmp.name, 'chronic')
+        rows = []
+        for location in ['California', 'Texas', 'New York']:
+            for year, topic in [(2019, 'Asthma'), (2020, 'Arthritis')]:
+                rows.append([year, year, location, topic, 'Sex', 'Male'])
+                rows.append([year, year, location, topic, 'Sex', 'Female'])
+                rows.append([year, year, location, topic, 'Age', 'Age 18-44'])
+                rows.append([year, year, location, topic, 'Age', 'Age 45-64'])
+                rows.append([year, year, location, topic, 'Race/Ethnicity', 'Hispanic'])
+        self.chronic_df = pd.DataFrame(rows, columns=['YearStart', 'YearEnd', 'LocationDesc', 'Topic', 'StratificationCategory1', 'Stratification1'])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_only_changed_partitions_are_rewritten(self):
+        self.assertEqual(sorted(write_partitions(self.chronic_df, self.part_dir)), ['California', 'New York', 'Texas'])
+        self.assertEqual(write_partitions(self.chronic_df, self.part_dir), [])
+
+        updated = self.chronic_df.copy()
+        updated.loc[updated['LocationDesc'] == 'Texas', 'Topic'] = 'Asthma'
+        self.assertEqual(write_partitions(updated, self.part_dir), ['Texas'])
+
+        texas = read_partitions(self.part_dir, values=['Texas'])
+        self.assertTrue((texas['LocationDesc'] == 'Texas').all())
+        self.assertTrue((texas['Topic'] == 'Asthma').all())
+
+    def test_process_partitioned(self):
+        write_partitions(self.chronic_df, self.part_dir)
+        combined = process_partitioned(self.part_dir, 'chronic', values=['California', 'Texas'], max_workers=2)
+        self.assertIsNotNone(combined, "Processing partitions returned None.")
+        self.assertEqual(sorted(combined['LocationDesc'].unique()), ['California', 'Texas'])
+        for col in ['Race/Ethnicity', 'Sex', 'Age_Bin']:
+            self.assertIn(col, combined.columns)
+
+    def test_partition_without_race_rows(self):
+        # Texas has Sex and Age rows but nothing to impute
+        no_race = (self.chronic_df['LocationDesc'] == 'Texas') & (self.chronic_df['StratificationCategory1'] == 'Race/Ethnicity')
+        write_partitions(self.chronic_df[~no_race], self.part_dir)
+        combined = process_partitioned(self.part_dir, 'chronic', max_workers=2)
+        self.assertIsNotNone(combined, "A partition with nothing to impute should not fail the run.")
+        self.assertEqual(sorted(combined['LocationDesc'].unique()), ['California', 'New York'])
+        self.assertEqual(len(combined), (self.chronic_df['StratificationCategory1'] == 'Race/Ethnicity').sum() - no_race.sum())
+
+    def test_missing_partition_values_are_kept(self):
+        with_missing = self.chronic_df.copy()
+        with_missing.loc[0, 'LocationDesc'] = None
+        write_partitions(with_missing, self.part_dir)
+        self.assertEqual(len(read_partitions(self.part_dir)), len(with_missing), "Rows without a LocationDesc were dropped.")
+
+        # The shard hash covers row order: reversed rows rewrite every multi-row partition
+        self.assertEqual(sorted(write_partitions(with_missing.iloc[::-1], self.part_dir)), ['California', 'New York', 'Texas'])
+
+    def test_only_touched_partitions_are_recomputed(self):
+        write_partitions(self.chronic_df, self.part_dir)
+        process_partitioned(self.part_dir, 'chronic', max_workers=2)
+        out_dir = os.path.join(self.part_dir, '_chronic_combined')
+
+        def results():
+            return {name.split('-', 2)[-1]: os.stat(os.path.join(out_dir, name)).st_mtime_ns for name in os.listdir(out_dir)}
+
+        # Texas has changed rows, so a refresh's ChangeSet names it in touched()
+        first = results()
+        detect_changes(self.chronic_df, 'chronic', ['YearStart', 'LocationDesc', 'Topic', 'Stratification1'], index_dir=self.tmp.name)
+        updated = self.chronic_df.copy()
+        updated.loc[(updated['LocationDesc'] == 'Texas') & (updated['YearStart'] == 2019), 'YearEnd'] = 2020
+        changes = detect_changes(updated, 'chronic', ['YearStart', 'LocationDesc', 'Topic', 'Stratification1'], index_dir=self.tmp.name)
+        self.assertEqual(touched(changes, 'LocationDesc'), ['Texas'])
+
+        combined = process_partitioned(self.part_dir, 'chronic', changed=touched(changes, 'LocationDesc'), max_workers=2)
+        self.assertEqual(sorted(combined['LocationDesc'].unique()), ['California', 'New York', 'Texas'])
+        second = results()
+        texas = read_manifest(self.part_dir)['partitions']['Texas']['file']
+        self.assertEqual([name for name in first if first[name] != second[name]], [texas],
+                         "Only the touched partition should be recomputed.")
+
+        process_partitioned(self.part_dir, 'chronic', changed=[], max_workers=2)
+        self.assertEqual(results(), second, "Untouched partitions should be reused.")
+
+    def test_new_forest_params_are_not_served_from_cache(self):
+        write_partitions(self.chronic_df, self.part_dir)
+        process_partitioned(self.part_dir, 'chronic', values=['Texas'], max_workers=1)
+        out_dir = os.path.join(self.part_dir, '_chronic_combined')
+        first = set(os.listdir(out_dir))
+        try:
+            augment.FOREST_PARAMS['chronic_sex'] = {'n_estimators': 5}
+            process_partitioned(self.part_dir, 'chronic', values=['Texas'], max_workers=1)
+        finally:
+            augment.FOREST_PARAMS.clear()
+        self.assertNotEqual(set(os.listdir(out_dir)), first, "A result cached with other parameters was reused.")
+
+    def test_unfittable_partition_is_not_dropped(self):
+        # Texas has no Sex rows, so its Sex classifier cannot be fitted on Texas alone
+        no_sex = (self.chronic_df['LocationDesc'] == 'Texas') & (self.chronic_df['StratificationCategory1'] == 'Sex')
+        write_partitions(self.chronic_df[~no_sex], self.part_dir)
+        combined = process_partitioned(self.part_dir, 'chronic', max_workers=2)
+        self.assertIsNotNone(combined, "Processing partitions returned None.")
+        self.assertEqual(sorted(combined['LocationDesc'].unique()), ['California', 'New York', 'Texas'])
+        self.assertTrue(combined['Sex'].notna().all())
+
+
+# Test the tuning harness
+class TestTuning(unittest.TestCase):
+    def test_tune_all(self):
+        features = pd.DataFrame({
+            'YearStart': [2015, 2016, 2017, 2018] * 30,
+            'LocationDesc': ['LocationA', 'LocationB', 'LocationC'] * 40,
+            'Topic': ['Asthma', 'Arthritis'] * 60
+        })
+        labels = features['LocationDesc'].map({'LocationA': 'Male', 'LocationB': 'Female', 'LocationC': 'Male'})
+        grid = {'n_estimators': [5, 10], 'max_depth': [None, 2], 'min_samples_leaf': [1, 5]}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            params_path = os.path.join(tmp, 'params.json')
+            results_path = os.path.join(tmp, 'results.csv')
+            chosen = tune_all({'nutri_sex': (features, labels)}, cache_dir=tmp, results_path=results_path,
+                              params_path=params_path, param_grid=grid, factor=2, min_resources=24, n_jobs=1)
+
+            self.assertIsNotNone(chosen, "Tuning returned None.")
+            self.assertEqual(set(chosen['nutri_sex']), set(grid))
+            records = pd.read_csv(results_path)
+            for col in ['classifier', 'n_rows', 'mean_fit_time', 'mean_test_score']:
+                self.assertIn(col, records.columns)
+            self.assertGreater(records['n_rows'].max(), records['n_rows'].min(), "Later rounds should use more rows.")
+
+            # Survivors and the cheapest first-round candidates are compared on all rows
+            full = records[records['stage'] == 'full']
+            survivors = records[(records['stage'] == 'halving') & (records['iter'] == records['iter'].max() - 1)]
+            self.assertTrue((full['n_rows'] == len(features)).all())
+            self.assertGreater(len(full), len(survivors), "Cheap candidates should be re-scored next to the survivors.")
+
+            cheapest = choose_params(records[records['classifier'] == 'nutri_sex'], tolerance=1.0)
+            fastest = full.sort_values('mean_fit_time').iloc[0]
+            self.assertEqual(cheapest['n_estimators'], fastest['n_estimators'])
+
+            try:
+                augment.load_forest_params(params_path)
+                self.assertEqual(augment.forest_params('nutri_sex')['n_estimators'], chosen['nutri_sex']['n_estimators'])
+                self.assertEqual(augment.forest_params('nutri_sex')['class_weight'], 'balanced')
+            finally:
+                augment.FOREST_PARAMS.clear()
+
+
+# Test bounded-time training on stratified samples
+class TestBudgetTraining(unittest.TestCase):
+    def setUp(self):
+        self.features = pd.DataFrame({
+            'YearStart': [2015, 2016, 2017, 2018] * 50,
+            'LocationDesc': ['LocationA'] * 150 + ['LocationB'] * 50,
+            'Topic': ['Asthma', 'Arthritis'] * 100
+        })
+        self.labels = self.features['LocationDesc'].map({'LocationA': 'Male', 'LocationB': 'Female'})
+        self.strata = pd.concat([self.labels.rename('Sex'), self.features['LocationDesc']], axis=1)
+
+    def make_clf(self):
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(n_estimators=5, random_state=42)
+
+    def test_stratified_sample(self):
+        rows = stratified_sample(self.strata, 40)
+        self.assertEqual(len(rows), 40)
+        self.assertEqual(len(set(rows)), 40, "Rows should not be drawn twice.")
+        self.assertEqual((self.features['LocationDesc'].iloc[rows] == 'LocationA').sum(), 30, "Stratum proportions not preserved.")
+        self.assertEqual(len(stratified_sample(self.strata, 1000)), len(self.strata))
+
+    def test_fit_within_budget(self):
+        X = pd.get_dummies(self.features)
+        clf, n_rows = fit_within_budget(self.make_clf, X, self.labels, self.strata, max_rows=50)
+        self.assertEqual(n_rows, 50)
+        self.assertEqual(set(clf.predict(X)), {'Male', 'Female'})
+
+        report = budget_report(self.make_clf, X, self.labels.to_numpy(), self.strata, X, max_rows=50)
+        for key in ['full_rows', 'budget_rows', 'full_accuracy', 'budget_accuracy', 'accuracy_lost', 'apply_agreement']:
+            self.assertIn(key, report)
+        self.assertEqual(report['budget_rows'], 50)
+        self.assertEqual(report['full_rows'], 160)
+
+
+# Test the background artifact writer
+class TestArtifactWriter(unittest.TestCase):
+    def test_write_and_report(self):
+        df = pd.DataFrame({'Sex': ['Female', 'Male'], 'BMI': [22.5, 31.0]})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'out.csv')
+            with ArtifactWriter(max_pending=1, background=True) as writer:
+                writer.write(df, path, index=False)
+                df.loc[0, 'BMI'] = 99.0  # The queued snapshot must not see this
+                writer.write(df, os.path.join(tmp, 'missing', 'out.csv'), index=False)
+            report = writer.report()
+
+            pd.testing.assert_frame_equal(pd.read_csv(path), pd.DataFrame({'Sex': ['Female', 'Male'], 'BMI': [22.5, 31.0]}))
+            self.assertEqual(report['files'], [(path, 2)])
+            self.assertEqual(len(report['errors']), 1, "A failed write should be reported, not raised.")
+            self.assertTrue(report['background'])
+            self.assertEqual(report['seconds_saved'], max(0.0, report['write_seconds'] - report['blocked_seconds']))
+            with self.assertRaises(RuntimeError):
+                writer.write(df, path)
+
+    def test_write_in_place(self):
+        df = pd.DataFrame({'Sex': ['Female', 'Male'], 'BMI': [22.5, 31.0]})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'out.csv')
+            with ArtifactWriter(background=False) as writer:
+                writer.write(df, path, index=False)
+                self.assertTrue(os.path.exists(path), "Without a background thread, write() should write before returning.")
+            self.assertEqual(writer.report()['files'], [(path, 2)])
+            self.assertEqual(writer.report()['seconds_saved'], 0.0, "Writing in place saves no time.")
+
+
+# Test the in-memory result cache
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+        def add_bmi(df):
+            self.calls += 1
+            return df.assign(BMI=df['Weight_kg'] / (df['Height_cm'] / 100) ** 2)
+
+        self.cache = ResultCache(max_mb=1)
+        self.add_bmi = cached(add_bmi, cache=self.cache)
+        self.df = pd.DataFrame({'Height_cm': [160.0, 180.0], 'Weight_kg': [60.0, 90.0]})
+
+    def test_hits_and_copies(self):
+        first = self.add_bmi(self.df)
+        first.loc[0, 'BMI'] = -1.0
+        second = self.add_bmi(self.df)
+        self.assertEqual(self.calls, 1, "The second call should be served from the cache.")
+        self.assertNotIn('BMI', self.df.columns, "The caller's frame should not be modified.")
+        self.assertAlmostEqual(second.loc[0, 'BMI'], 60 / 1.6 ** 2, msg="A cached result was modified through a returned copy.")
+        self.assertEqual((self.cache.stats()['hits'], self.cache.stats()['misses']), (1, 1))
+
+    def test_edited_frame_misses(self):
+        self.add_bmi(self.df)
+        edited = self.df.copy()
+        edited.loc[1, 'Weight_kg'] = 91.0
+        self.add_bmi(edited)
+        self.assertEqual(self.calls, 2, "An edited frame must not hit a stale entry.")
+        self.assertNotEqual(fingerprint(self.df), fingerprint(self.df.iloc[::-1].reset_index(drop=True)))
+
+    def test_eviction_under_cap(self):
+        big = pd.DataFrame({'Height_cm': range(30_000), 'Weight_kg': range(30_000)}, dtype=float)
+        self.add_bmi(big)  # ~0.7 MB with BMI; two of these do not fit under the 1 MB cap
+        self.add_bmi(big + 1)
+        self.add_bmi(big + 1)
+        stats = self.cache.stats()
+        self.assertLessEqual(stats['mb'], stats['max_mb'])
+        self.assertEqual((stats['evictions'], stats['entries']), (1, 1))
+        self.assertEqual(self.calls, 2)
+        self.add_bmi(big)
+        self.assertEqual(self.calls, 3, "The least recently used result should have been evicted.")
+
+
+# Test row-level change detection between refreshes
+class TestChangeDetection(unittest.TestCase):
+    def setUp(self):
+        self.key_cols = ['YearStart', 'LocationDesc', 'QuestionID']
+        self.old_df = pd.DataFrame({
+            'YearStart': [2015, 2015, 2016, 2016],
+            'LocationDesc': ['LocationA', 'LocationA', 'LocationB', 'LocationC'],
+            'QuestionID': ['Q1', 'Q1', 'Q2', 'Q3'],
+            'Data_Value': [1, 2, 3, 4]
+        })
+
+    def test_detect_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first = detect_changes(self.old_df, 'nutri', self.key_cols, index_dir=tmp)
+            self.assertEqual(len(first.inserted), 4, "Every row is new on the first refresh.")
+
+            # Same rows with columns reordered and Data_Value now float: nothing changed
+            same = detect_changes(self.old_df[['Data_Value'] + self.key_cols].astype({'Data_Value': float}),
+                                  'nutri', self.key_cols, index_dir=tmp)
+            self.assertEqual((same.changed, same.unchanged), (0, 4))
+
+            new_df = self.old_df.drop(index=3).astype({'Data_Value': float})
+            new_df.loc[1, 'Data_Value'] = 2.5  # Second row of a duplicated key
+            new_df.loc[4] = [2017, 'LocationD', 'Q4', 5.0]
+            changes = detect_changes(new_df, 'nutri', self.key_cols, index_dir=tmp)
+
+            self.assertListEqual(changes.updated.index.tolist(), [1])
+            self.assertListEqual(changes.inserted['LocationDesc'].tolist(), ['LocationD'])
+            self.assertListEqual(changes.deleted['LocationDesc'].tolist(), ['LocationC'])
+            self.assertEqual(changes.unchanged, 2)
+            self.assertListEqual(touched(changes, 'LocationDesc'), ['LocationA', 'LocationC', 'LocationD'])
+
+    def test_index_saved_only_after_write(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            changes = detect_changes(self.old_df, 'nutri', self.key_cols, index_dir=tmp, save=False)
+            with ArtifactWriter(background=True) as writer:
+                writer.write(self.old_df, os.path.join(tmp, 'missing', 'nutri.csv'),
+                             on_written=lambda: save_index(changes, 'nutri', index_dir=tmp))
+            self.assertEqual(len(writer.report()['errors']), 1)
+            again = detect_changes(self.old_df, 'nutri', self.key_cols, index_dir=tmp, save=False)
+            self.assertEqual(len(again.inserted), 4, "A failed write must not mark the data as unchanged.")
+
+            with ArtifactWriter(background=True) as writer:
+                writer.write(self.old_df, os.path.join(tmp, 'nutri.csv'), on_written=lambda: save_index(again, 'nutri', index_dir=tmp))
+            self.assertEqual(detect_changes(self.old_df, 'nutri', self.key_cols, index_dir=tmp).changed, 0)
+
+
+# Test the approximate aggregate sketches
+class TestSketches(unittest.TestCase):
+    def test_count_min_error_bound(self):
+        import numpy as np
+        keys = pd.Series(np.random.default_rng(0).zipf(1.5, 20_000) % 5000).astype(str)
+        sketch = CountMinSketch(epsilon=0.01, delta=0.01)
+        sketch.update(keys.to_numpy())
+
+        exact = keys.value_counts()
+        estimates = sketch.estimate(exact.index.to_numpy())
+        self.assertTrue((estimates >= exact.to_numpy()).all(), "Count-min must never underestimate.")
+        self.assertLessEqual(((estimates - exact.to_numpy()) > 0.01 * len(keys)).mean(), 0.01)
+
+    def test_quantile_relative_error(self):
+        import numpy as np
+        values = np.random.default_rng(0).lognormal(3.2, 0.3, 50_000)
+        sketch = QuantileSketch(accuracy=0.01)
+        sketch.update(values[:25_000])
+        sketch.merge(QuantileSketch(accuracy=0.01))
+        other = QuantileSketch(accuracy=0.01)
+        other.update(values[25_000:])
+        sketch.merge(other)
+
+        qs = [0.01, 0.25, 0.5, 0.75, 0.99]
+        exact = np.quantile(values, qs, method='lower')
+        self.assertLessEqual(np.abs(sketch.quantiles(qs) / exact - 1).max(), 0.01 + 1e-9)
+
+    def test_result_sketch_merge_and_save(self):
+        full_df = pd.DataFrame({
+            'Sex': ['Female', 'Male', 'Female', 'Male'] * 25,
+            'Age_Bin': ['18-44', '45-64', '65+', '18-44'] * 25,
+            'BMI': [22.0, 27.5, 31.0, 24.0] * 25,
+            'heart_rate': [80.0, 95.0, 120.0, 70.0] * 25,
+            'Assigned_Disease': ['Arthritis', None, 'Nutrition, Physical Activity, and Weight Status', 'Asthma'] * 25
+        })
+        first, second = ResultSketch(), ResultSketch()
+        first.update(full_df.iloc[:40])
+        second.update(full_df.iloc[40:])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, 'first.json'), os.path.join(tmp, 'second.json')]
+            save_sketch(first, paths[0])
+            save_sketch(second, paths[1])
+            merged = load_sketches(paths)
+
+        disease_counts, disease_sex, disease_age = merged.disease_tables()
+        exact_counts, exact_sex, exact_age = analyze_assigned_diseases(full_df)
+        pd.testing.assert_series_equal(disease_counts.sort_index(), exact_counts.sort_index(), check_dtype=False)
+        pd.testing.assert_frame_equal(disease_sex, exact_sex, check_dtype=False)
+        pd.testing.assert_frame_equal(disease_age, exact_age, check_dtype=False)
+        self.assertEqual(merged.rows, 100)
+        self.assertAlmostEqual(merged.distribution('BMI', sex='Male', age_bin='45-64').quantiles([0.5])[0], 27.5, delta=27.5 * 0.01)
+
+
+# Test that importing the pipeline does not pull in heavy dependencies
+class TestStartup(unittest.TestCase):
+    def test_main_import_is_lightweight(self):
+        code = "import sys, main; print(','.join(m for m in ['sklearn', 'matplotlib', 'seaborn'] if m in sys.modules))"
+        loaded = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.strip()
+        self.assertEqual(loaded, '', f"Importing main.py loaded heavy modules: {loaded}")
+
+
+# Test the batch scoring service
+class TestScoringService(unittest.TestCase):
+    def setUp(self):
+        second_disease_df = pd.DataFrame({
+            'Sex': ['Female', 'Male', 'Female'],
+            'Age_Bin': ['18-44', '18-44', '45-64'],
+            'Obesity_Binary': [1, 1, 1],
+            'Topic': ['Heart', 'Obesity', 'Hypertension']
+        })
+        self.model = fit_disease_model(second_disease_df)
+        self.row = {
+            'device': 'fitbit', 'activity': 'Lying', 'gender': 0, 'age': 30, 'height': 170, 'weight': 70,
+            'hear_rate': 120, 'sd_norm_heart': 1, 'resting_heart': 60, 'intensity_karvonen': 0.5
+        }
+
+    def test_concurrent_requests_are_batched(self):
+        async def run():
+            service = ScoringService(self.model, max_wait_ms=50)
+            service.start()
+            results = await asyncio.gather(*[service.score([self.row] * 3) for _ in range(10)])
+            await service.stop()
+            return service, results
+
+        service, results = asyncio.run(run())
+        self.assertEqual(len(results), 10)
+        for result in results:
+            self.assertEqual(len(result), 3)
+            self.assertIsNotNone(result[0]['Assigned_Disease'])
+        self.assertLess(service.batches, 10, "Concurrent requests were not micro-batched.")
+        self.assertIn('p99_ms', service.stats())
+
+    def test_missing_columns_rejected(self):
+        async def run():
+            service = ScoringService(self.model)
+            service.start()
+            try:
+                await service.score([{'device': 'fitbit'}])
+            finally:
+                await service.stop()
+
+        with self.assertRaises(ValueError):
+            asyncio.run(run())
+
+    def test_non_object_rows_rejected(self):
+        async def run(rows):
+            service = ScoringService(self.model)
+            service.start()
+            try:
+                await service.score(rows)
+            finally:
+                await service.stop()
+
+        for rows in ([self.row, 'fitbit'], [[1, 2]], 'fitbit'):
+            with self.assertRaises(ValueError):
+                asyncio.run(run(rows))
+
+    def test_rolling_window_models_rejected(self):
+        with self.assertRaises(ValueError, msg="Single readings cannot follow a min_exceedances rule."):
+            ScoringService(dict(self.model, min_exceedances=2))
+
+    def test_bad_request_does_not_fail_its_batch(self):
+        async def run():
+            service = ScoringService(self.model, max_wait_ms=50)
+            service.start()
+            results = await asyncio.gather(service.score([self.row]), service.score([dict(self.row, age='thirty')]),
+                                           return_exceptions=True)
+            await service.stop()
+            return results
+
+        good, bad = asyncio.run(run())
+        self.assertEqual(len(good), 1, "A valid request failed because of another request in its batch.")
+        self.assertIsInstance(bad, ValueError)
+
+
+# Test the streaming detector
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.raw_df = pd.DataFrame({
+            'device': ['apple watch', 'fitbit', 'fitbit'],
+            'activity': ['Lying', 'Running 7 METs', 'Sitting'],
+            'gender': [0, 1, 1],
+            'age': [30, 50, 70],
+            'height': [170, 180, 160],
+            'weight': [70, 95, 50],
+            'hear_rate': [120, 80, 150],
+            'sd_norm_heart': [1, 5, 2],
+            'resting_heart': [60, 70, 65],
+            'intensity_karvonen': [0.5, 0.9, 0.2]
+        })
+
+    def test_clean_reading_matches_process_aw_fb_data(self):
+        processed = process_aw_fb_data(self.raw_df)
+        for i, raw in enumerate(self.raw_df.to_dict(orient='records')):
+            reading = clean_reading(raw)
+            for col in processed.columns:
+                self.assertEqual(reading[col], processed[col].iloc[i], f"Streaming {col} differs from process_aw_fb_data.")
+
+    def test_windows_are_bounded(self):
+        alerts = []
+        detector = StreamingDetector(window=3, min_exceedances=2, max_participants=2, on_alert=alerts.append)
+        raw = self.raw_df.iloc[0].to_dict()
+        for _ in range(5):
+            detector.process(raw)
+        self.assertEqual(len(alerts), 4, "Alerts should start once two flagged readings are in the window.")
+        self.assertEqual(alerts[-1]['window_size'], 3)
+
+        for age in range(18, 28):
+            detector.process(dict(raw, age=age))
+        self.assertEqual(detector.stats()['participants'], 2)
+
+    def test_follow_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'feed.csv')
+            self.raw_df.to_csv(path, index=False)
+            events = list(follow_file(path, poll_interval=0.01, idle_timeout=0.05))
+        self.assertEqual(len(events), 3)
+        raw, received = events[0]
+        self.assertEqual(clean_reading(raw)['Disease'], 1)
+        self.assertLessEqual(received, time.perf_counter())
+
+    def test_non_finite_readings_rejected(self):
+        detector = StreamingDetector(window=3, on_alert=lambda alert: None)
+        raw = self.raw_df.iloc[0].to_dict()
+        detector.process(raw)
+        detector.process(dict(raw, hear_rate='nan'))
+        self.assertEqual(detector.stats()['errors'], 1)
+        alert = detector.process(raw)
+        self.assertEqual(alert['window_size'], 2, "A rejected reading should not enter the window.")
+        self.assertEqual(alert['window_mean'], 120.0)
+        self.assertEqual(alert['window_sd'], 0.0)
+
+        # Sample SD, as heart_rate_roll_var in add_rolling_heart_features
+        alert = detector.process(dict(raw, hear_rate=130))
+        self.assertAlmostEqual(alert['window_sd'], pd.Series([120.0, 120.0, 130.0]).std())
+
+    def test_follow_socket_skips_malformed_lines(self):
+        lines = [json.dumps(raw) for raw in self.raw_df.to_dict(orient='records')]
+        lines.insert(1, '{"device": "fitbit",')
+        server = socket.create_server(('127.0.0.1', 0))
+
+        def send():
+            conn, _ = server.accept()
+            with conn:
+                conn.sendall(('\n'.join(lines) + '\n').encode())
+
+        sender = threading.Thread(target=send)
+        sender.start()
+        with server:
+            detector = StreamingDetector(on_alert=lambda alert: None)
+            stats = detector.run(follow_socket(*server.getsockname()))
+        sender.join()
+        self.assertEqual(stats['events'], 4)
+        self.assertEqual(stats['errors'], 1, "A malformed line should be counted, not stop the detector.")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,202 @@
+import json
+import time
+import numpy as np
+import pandas as pd
+from config import TUNE_CACHE_DIR, TUNING_RESULTS, TUNED_PARAMS
+from augment import FOREST_DEFAULTS
+from shared import FeatureMatrixStore, attach
+
+
+# Tree count, depth and leaf size searched for every classifier
+PARAM_GRID = {
+    'n_estimators': [25, 50, 100, 200],
+    'max_depth': [None, 8, 16],
+    'min_samples_leaf': [1, 5, 20],
+}
+
+# Cheapest first-round candidates re-scored on all rows next to the halving survivors, since halving
+# keeps only the most accurate candidates and a cheaper one within tolerance could not be chosen otherwise
+RESCORE_CHEAPEST = 4
+
+
+# --- 1. TRAINING DATA OF EACH CLASSIFIER
+def tuning_datasets(nutri_sex_df, nutri_age_df, chronic_sex_df, chronic_age_df, nutri_combined, second_disease_df) -> dict:
+    """
+    Collects the training features and labels of the six classifiers in augment.py.
+
+    Args:
+        nutri_sex_df, nutri_age_df: DataFrames from process_nutri_data.
+        chronic_sex_df, chronic_age_df: DataFrames from process_chronic_data.
+        nutri_combined: The DataFrame from predict_sex_age_nutri.
+        second_disease_df: The DataFrame from predict_obesity.
+
+    Returns:
+        dict: classifier name (as in augment.FOREST_DEFAULTS) -> (features DataFrame, labels Series).
+    """
+    survey_cols = ['YearStart', 'YearEnd', 'LocationDesc', 'Topic']
+    demographic_cols = ['LocationDesc', 'Race/Ethnicity', 'Sex', 'Age_Bin']
+    obese_df = second_disease_df[second_disease_df['Obesity_Binary'] == 1]
+
+    return {
+        'nutri_sex': (nutri_sex_df[survey_cols], nutri_sex_df['Sex']),
+        'nutri_age': (nutri_age_df[survey_cols], nutri_age_df['age_bin']),
+        'chronic_sex': (chronic_sex_df[survey_cols], chronic_sex_df['Sex']),
+        'chronic_age': (chronic_age_df[survey_cols], chronic_age_df['age_bin']),
+        'obesity': (nutri_combined[demographic_cols], (nutri_combined['Topic'] == 'Obesity / Weight Status').astype(int)),
+        'disease': (obese_df[['Sex', 'Age_Bin']], obese_df['Topic']),
+    }
+
+
+def encode_cached(name, features, labels, store):
+    """
+    One-hot-encodes features and label-encodes labels, reusing matrices cached in `store` from an
+    earlier run when the inputs are unchanged (keyed by a content hash of features and labels).
+
+    Returns:
+        tuple: (X, y) as memory-mapped arrays.
+    """
+    key = format(int(pd.util.hash_pandas_object(pd.concat([features, labels.rename('__label__')], axis=1), index=False).sum()), '016x')
+    X_name, y_name = f"{name}-{key}-X", f"{name}-{key}-y"
+
+    X, y = store.get(X_name), store.get(y_name)
+    if X is None or y is None:
+        print(f"Encoding {name} (not cached)...")
+        _, y_codes = np.unique(labels.to_numpy(), return_inverse=True)
+        X = store.put(X_name, pd.get_dummies(features))
+        y = store.put(y_name, y_codes, dtype=np.int64)
+    return attach(X), attach(y)
+
+
+# --- 2. SUCCESSIVE HALVING
+def tune_classifier(name, X, y, param_grid=PARAM_GRID, factor=3, cv=3, scoring='accuracy', min_resources='exhaust', n_jobs=-1,
+                    rescore_cheapest=RESCORE_CHEAPEST) -> pd.DataFrame:
+    """
+    Successive halving over row subsamples: every candidate is cross-validated on a small sample,
+    and only the best 1/factor move on to factor times more rows, until the survivors use all rows.
+    Then the survivors and the `rescore_cheapest` cheapest first-round candidates are cross-validated
+    on all rows with the same folds (stage 'full'), so accuracy and fit time compare like for like.
+
+    Args:
+        name: The classifier name (its fixed parameters come from augment.FOREST_DEFAULTS).
+        X, y: The encoded training data.
+        param_grid: The parameter grid searched.
+        factor: Candidate reduction / row growth per round.
+        cv: Stratified cross-validation folds, run in parallel.
+        scoring: The scikit-learn scorer.
+        min_resources: Rows used in the first round ('exhaust' makes the last round use all rows).
+        n_jobs: Parallel fits (-1 uses every core).
+        rescore_cheapest: First-round candidates, by fit time, added to the final comparison.
+
+    Returns:
+        pd.DataFrame: One row per candidate and round with rows used, fit time and score; the
+                      'full' stage rows (the last iter) are the ones choose_params compares.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.model_selection import HalvingGridSearchCV, StratifiedKFold, cross_validate
+
+    print(f"Tuning {name} on {X.shape[0]} rows...")
+    folds = StratifiedKFold(n_splits=cv, shuffle=True, random_state=42)
+    search = HalvingGridSearchCV(
+        RandomForestClassifier(**FOREST_DEFAULTS[name]),
+        param_grid,
+        factor=factor,
+        resource='n_samples',
+        min_resources=min_resources,
+        cv=folds,
+        scoring=scoring,
+        n_jobs=n_jobs,
+        refit=False,
+        random_state=42,
+    )
+    start = time.perf_counter()
+    search.fit(X, y)
+    print(f"Tuned {name} in {time.perf_counter() - start:.1f}s; best {search.best_params_} ({search.best_score_:.4f})")
+
+    results = pd.DataFrame(search.cv_results_)
+    records = pd.DataFrame({
+        'classifier': name,
+        'stage': 'halving',
+        'iter': results['iter'],
+        'n_rows': results['n_resources'],
+        'mean_fit_time': results['mean_fit_time'],
+        'mean_test_score': results['mean_test_score'],
+        'std_test_score': results['std_test_score'],
+    })
+    records = pd.concat([records, pd.DataFrame(list(results['params']))], axis=1)
+
+    # The halving survivors plus the cheapest first-round candidates, on all rows and the same folds
+    last_iter = results['iter'].max()
+    survivors = results.loc[results['iter'] == last_iter, 'params'].tolist()
+    first = results[results['iter'] == 0].sort_values('mean_fit_time')
+    cheapest = [params for params in first['params'] if params not in survivors][:rescore_cheapest]
+
+    full = []
+    print(f"Scoring {len(survivors) + len(cheapest)} candidates on all {X.shape[0]} rows...")
+    for params in survivors + cheapest:
+        scores = cross_validate(RandomForestClassifier(**FOREST_DEFAULTS[name], **params), X, y, cv=folds,
+                                scoring=scoring, n_jobs=n_jobs)
+        full.append({'classifier': name, 'stage': 'full', 'iter': last_iter + 1, 'n_rows': X.shape[0],
+                     'mean_fit_time': scores['fit_time'].mean(), 'mean_test_score': scores['test_score'].mean(),
+                     'std_test_score': scores['test_score'].std(), **params})
+    return pd.concat([records, pd.DataFrame(full)], ignore_index=True)
+
+
+def choose_params(records, tolerance=0.0) -> dict:
+    """
+    Picks the cheapest candidate scored on all rows (the halving survivors and the cheapest
+    first-round candidates) whose score is within `tolerance` of the best of them.
+    tolerance=0 returns the most accurate candidate.
+
+    Args:
+        records: The DataFrame from tune_classifier for one classifier.
+        tolerance: Accuracy the caller is willing to give up for a cheaper fit.
+
+    Returns:
+        dict: The chosen grid parameters.
+    """
+    final = records[records['stage'] == 'full']
+    eligible = final[final['mean_test_score'] >= final['mean_test_score'].max() - tolerance]
+    chosen = eligible.sort_values(['mean_fit_time', 'mean_test_score'], ascending=[True, False]).iloc[0]
+
+    params = {}
+    for key in PARAM_GRID:
+        value = chosen[key]
+        params[key] = None if pd.isna(value) else int(value)
+    return params
+
+
+def tune_all(datasets, tolerance=0.0, cache_dir=TUNE_CACHE_DIR, results_path=TUNING_RESULTS, params_path=TUNED_PARAMS, **tune_kwargs) -> dict:
+    """
+    Tunes every classifier, records fit cost against accuracy, and writes the chosen parameters
+    in the format read by augment.load_forest_params.
+
+    Args:
+        datasets: The dict from tuning_datasets.
+        tolerance: Passed to choose_params.
+        cache_dir: Where encoded matrices are cached between runs.
+        results_path: CSV of every candidate's rows used, fit time and score.
+        params_path: JSON of the chosen parameters per classifier.
+        **tune_kwargs: Passed to tune_classifier.
+
+    Returns:
+        dict: classifier name -> chosen parameters.
+    """
+    try:
+        store = FeatureMatrixStore(cache_dir)
+        records, chosen = [], {}
+        for name, (features, labels) in datasets.items():
+            X, y = encode_cached(name, features, labels, store)
+            result = tune_classifier(name, X, y, **tune_kwargs)
+            records.append(result)
+            chosen[name] = choose_params(result, tolerance=tolerance)
+
+        pd.concat(records, ignore_index=True).to_csv(results_path, index=False)
+        with open(params_path, 'w') as f:
+            json.dump(chosen, f, indent=2)
+
+        print(f"Tuning results saved to {results_path}; chosen parameters saved to {params_path}.")
+        return chosen
+
+    except Exception as e:
+        print(f"Could not tune classifiers: {e}")
@@ -0,0 +1,139 @@
+import os
+import time
+import queue
+import threading
+import pandas as pd
+from config import ARTIFACT_QUEUE_SIZE, ARTIFACT_BACKGROUND
+
+
+# Sentinel telling the writer thread to stop
+_STOP = object()
+
+
+class ArtifactWriter:
+    """
+    Writes DataFrames to CSV on a background thread so the pipeline can move on to the next stage
+    while the file is written. The queue is bounded, so at most `max_pending` snapshots are held in
+    memory; when it is full, write() waits for the thread to catch up.
+
+    pandas' CSV writer holds the GIL for much of its work, so the overlap pays off most when the next
+    stage runs in native code that releases it (scikit-learn's tree building, NumPy) or waits on I/O.
+    The thread also competes with the pipeline for CPU: on a single CPU it measured slower than writing
+    in place, so by default frames are only written in the background when there is more than one CPU
+    (benchmarks.py writer measures the difference on a given machine). Otherwise write() writes in place.
+
+    Errors in the background are collected and reported by close() rather than raised mid-run.
+    Used as a context manager, close() is called on exit.
+    """
+
+    def __init__(self, max_pending=ARTIFACT_QUEUE_SIZE, background=ARTIFACT_BACKGROUND):
+        """
+        Args:
+            max_pending: Frames that may wait in the queue before write() blocks.
+            background: Write on a background thread (True), in place (False), or only when there is
+                        more than one CPU (None).
+        """
+        if background is None:
+            background = (os.cpu_count() or 1) > 1
+        self.background = background
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name='artifact-writer', daemon=True)
+        self._closed = False
+        self.files = []
+        self.errors = []
+        self.write_seconds = 0.0
+        self.blocked_seconds = 0.0
+        if background:
+            self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                return
+            self._write(*job)
+
+    def _write(self, df, path, on_written, kwargs):
+        start = time.perf_counter()
+        try:
+            df.to_csv(path, **kwargs)
+            self.files.append((path, len(df)))
+            if on_written is not None:
+                on_written()
+        except Exception as e:
+            self.errors.append((path, str(e)))
+        finally:
+            self.write_seconds += time.perf_counter() - start
+
+    def write(self, df, path, on_written=None, **kwargs):
+        """
+        Queues df to be written to path with df.to_csv(path, **kwargs).
+
+        A copy of df is queued, so the caller may keep modifying df after this returns (a shallow copy
+        when pandas' copy-on-write mode is on, which main.py enables). The time spent
+        copying and waiting for a free queue slot (or, when not writing in the background, writing) is
+        counted as time the pipeline was blocked.
+
+        Args:
+            df: The DataFrame to write.
+            path: The CSV file path.
+            on_written: Called (on the writer thread) only once the file was written successfully.
+            **kwargs: Passed to DataFrame.to_csv (e.g. index=False).
+        """
+        if self._closed:
+            raise RuntimeError("ArtifactWriter is closed")
+        start = time.perf_counter()
+        if self.background:
+            # With copy-on-write a shallow copy is enough: later changes to df copy its data first
+            self._queue.put((df.copy(deep=pd.options.mode.copy_on_write is not True), path, on_written, kwargs))
+        else:
+            self._write(df, path, on_written, kwargs)
+        self.blocked_seconds += time.perf_counter() - start
+
+    def close(self) -> dict:
+        """
+        Waits for every queued frame to be written and reports the run.
+
+        Returns:
+            dict: files (path, rows) written, errors (path, message), whether they were written in the
+                  background, write_seconds spent writing, and blocked_seconds the pipeline spent in
+                  write() and close(). seconds_saved is the writing the pipeline did not wait for
+                  (write_seconds - blocked_seconds, at least 0).
+        """
+        if not self._closed:
+            self._closed = True
+            if self.background:
+                start = time.perf_counter()
+                self._queue.put(_STOP)
+                self._thread.join()
+                self.blocked_seconds += time.perf_counter() - start
+        return self.report()
+
+    def report(self) -> dict:
+        return {
+            'files': list(self.files),
+            'errors': list(self.errors),
+            'background': self.background,
+            'write_seconds': self.write_seconds,
+            'blocked_seconds': self.blocked_seconds,
+            'seconds_saved': max(0.0, self.write_seconds - self.blocked_seconds),
+        }
+
+
+def print_report(report):
+    """Prints the files written and any errors from ArtifactWriter.close()."""
+    for path, rows in report['files']:
+        print(f"Saved {os.path.basename(path)} ({rows} rows).")
+    for path, message in report['errors']:
+        print(f"Could not save {path}: {message}")
+    if report['background']:
+        print(f"Artifacts written in {report['write_seconds']:.2f}s on a background thread; "
+              f"the pipeline waited {report['blocked_seconds']:.2f}s for it (time saved: {report['seconds_saved']:.2f}s).")
+    else:
+        print(f"Artifacts written in place in {report['write_seconds']:.2f}s (background writes need more than one CPU).")